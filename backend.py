@@ -1,38 +1,148 @@
 import io
 import os
 import time
-import json
+import copy
+import atexit
+import hashlib
+import threading
+import numpy as np
 import pandas as pd
 from datetime import date, datetime
 from dateutil.relativedelta import relativedelta
-from office365.runtime.auth.client_credential import ClientCredential
-from office365.sharepoint.client_context import ClientContext
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterable
+from collections import OrderedDict
+from dataclasses import dataclass, replace
 from utils.models import KPI, KPIType
 from utils.constants import MONTH_OPTIONS
+from utils.numeric import NumericCells, parse_numeric, columns_matrix
+from utils.kpi_eval import TYPE_CODES, RED
+from utils.status_cube import StatusCube
+from utils.snapshot import save_snapshot, load_snapshot
+from utils.journal import EditJournal
+from utils.pending_queue import PendingQueue, QueueKey
+from utils.sharepoint_context import ContextProvider, FactoryContextProvider, PooledContextProvider
+from utils.storage import StorageDriver, StorageLockedError, SharePointDriver, LocalDirectoryDriver
+from utils.workbook import EXCEL_ENGINE, read_workbook, overlay_columns, patch_workbook, row_key
+from utils.metrics import metrics, get_logger
 from pathlib import Path
 
+log = get_logger("backend")
+
+
+@dataclass
+class CacheState:
+    """Frame publicado + estruturas derivadas; trocado inteiro numa única atribuição"""
+    df: pd.DataFrame
+    sector_index: Dict[str, np.ndarray]
+    available_sectors: List[str]
+    historic: Dict[str, Any]
+    cube: StatusCube  # avaliação KPI x mês agregada por setor (dashboard)
+    fetched_at: float  # quando estes dados foram confirmados na origem (idade real dos dados)
+    row_index: Dict[Tuple[str, str], int]  # (setor normalizado, 序号 No.) -> posição da linha
+    id_index: Dict[str, int]               # 序号 No. -> primeira linha (escritas sem setor)
+    duplicate_keys: List[Tuple[str, str]]  # chaves repetidas na planilha (vale a primeira linha)
+
 
 class SharePointBackend:
-    def __init__(self):
+    def __init__(self, context_factory: Optional[Callable[[], Any]] = None,
+                 stale_while_revalidate: bool = False,
+                 context_provider: Optional[ContextProvider] = None,
+                 storage: Optional[StorageDriver] = None,
+                 cache_dir: Optional[Path] = None):
         self.site_url = "https://gwmglobal.sharepoint.com/sites/DataAnalytics"
         self.client_id = "6c81a342-620c-4614-9398-522af668fcdd"
         self.client_secret = ${{secrets.sharepoint_secret}}
         self.remote_file_url = "Shared Documents/5.Information Registry/KPISystem.xlsx"
         self.local_file_name = "../KPISystem.xlsx"
 
-        # Cache na memória
-        self.df_cache = None
+        # Onde mora o arquivo (utils/storage.py): SharePoint por padrão, ou um driver
+        # local / simulado para rodar offline e medir refresh e save sem o tenant.
+        if storage is None:
+            # Contextos autenticados reaproveitados entre downloads/uploads (token + keep-alive).
+            # Permite injetar um substituto local do ClientContext (testes / offline)
+            if context_provider is None:
+                context_provider = FactoryContextProvider(context_factory) if context_factory is not None \
+                    else PooledContextProvider(self.site_url, self.client_id, self.client_secret)
+            storage = SharePointDriver(context_provider, self.remote_file_url)
+        self.storage = storage
+
+        # Metadados e hash do último arquivo baixado (download condicional)
+        self._remote_metadata: Optional[Dict[str, Any]] = None
+        self._remote_content_hash: Optional[str] = None
+        self._remote_bytes: Optional[bytes] = None
+
+        # Cache na memória: frame + índice por setor + matrizes do histórico (ver CacheState).
+        # O estado publicado nunca é alterado: leitores pegam self._state uma vez, sem lock;
+        # escritores montam um novo estado (copy-on-write) e publicam sob _write_lock.
+        self._state: Optional[CacheState] = None
+        self._write_lock = threading.RLock()
+
+        # Versão dos dados: incrementa a cada refresh e a cada save_kpi
+        self.data_version = 0
+        self._refresh_generation = 0
+        self._sector_edit_versions: Dict[str, int] = {}
+
+        # Memoização LRU das views por setor: (tipo, setor, mês avaliado, versão) -> resultado
+        self._view_cache: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._view_cache_lock = threading.Lock()
+        self.view_cache_max_entries = 64
 
         # Controle de Cache (TTL) - 15 minutos para auto-refresh
         self.last_fetch_time = 0
         self.cache_validity_seconds = 900  # 900 segundos = 15 minutos
 
+        # Opt-in: com TTL vencido, continua servindo os dados atuais enquanto
+        # uma única thread atualiza em background (nenhuma página espera rede)
+        self.stale_while_revalidate = stale_while_revalidate
+        self._refresh_thread: Optional[threading.Thread] = None
+
+        # Single-flight: um único fetch por vez; quem chega durante um fetch espera e reaproveita
+        self._refresh_lock = threading.Lock()
+        # Uploads concluídos (sob _write_lock): um fetch que começou antes de um upload terminar
+        # baixou um arquivo mais velho que a memória e é descartado
+        self._upload_generation = 0
+        self._last_refresh_completed = float("-inf")  # time.monotonic() do último fetch concluído
+        # Debounce: cliques em "Refresh Data" dentro deste intervalo viram um único fetch
+        self.min_force_refresh_interval = 10  # segundos
+
         # 🆕 Sistema de Cache Persistente e Fila de Pendências
-        self.cache_dir = Path(__file__).parent / ".cache"
-        self.cache_dir.mkdir(exist_ok=True)
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else Path(__file__).parent / ".cache"
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
         self.pending_queue_file = self.cache_dir / "pending_queue.json"
         self.pending_queue = self._load_pending_queue()
+        metrics.gauge_callback("kpi_pending_queue_depth", lambda: len(self.pending_queue),
+                               help="Itens na fila de pendências")
+        metrics.gauge_callback("kpi_data_age_seconds", self.get_data_age_seconds,
+                               help="Idade dos dados servidos (desde a confirmação na origem)")
+
+        # Snapshot colunar local (.cache/df_snapshot.*) para warm start e fallback offline
+        self._snapshot_lock = threading.Lock()
+
+        # Journal de edições (.cache/edits.jsonl): cada save_kpi custa um append; no startup
+        # é reaplicado sobre o snapshot e é compactado sempre que um novo snapshot é salvo
+        self._journal = EditJournal(self.cache_dir / "edits.jsonl")
+        self.journal_compact_every = 100  # edições acumuladas que disparam um novo snapshot
+        self._snapshot_seq = 0   # último seq do journal contido no snapshot gravado
+        # Último seq do journal que já subiu: a compactação nunca passa dele, então edições que
+        # estão no snapshot mas ainda não no SharePoint continuam no journal e voltam sujas no startup
+        self._uploaded_seq = 0
+
+        # Write-behind: save_kpi só grava memória + snapshot + fila; uma thread junta as
+        # edições que chegam dentro da janela e sobe o workbook uma única vez
+        self.write_behind = True
+        self.upload_coalesce_seconds = 5    # janela de agrupamento, contada da 1ª edição do lote
+        self.upload_retry_seconds = 60      # espera antes de tentar de novo um lote que falhou
+        self._upload_cond = threading.Condition()
+        self._upload_batch: List[Tuple[Any, str, str]] = []  # (kpi_id, setor, sufixo do mês)
+        self._upload_batch_started = 0.0
+        self._uploader_thread: Optional[threading.Thread] = None
+        self._upload_mutex = threading.Lock()  # um upload por vez (thread e flush_uploads)
+
+        # Upload por patch: só as células editadas são gravadas sobre o último workbook baixado
+        self.patch_upload = True
+        self._dirty_cells: Dict[Tuple[str, str], set] = {}  # row_key -> colunas editadas
+        self._dirty_lock = threading.Lock()
+        atexit.register(self.flush_uploads)
 
         # Mapeamento do Backend
         self.months_map = {
@@ -43,27 +153,65 @@ class SharePointBackend:
             9: {"target": "9月 Sep.", "suffix": "Sep"}, 10: {"target": "10月 Oct.", "suffix": "Oct"},
             11: {"target": "11月 Nov.", "suffix": "Nov"}, 12: {"target": "12月 Dec.", "suffix": "Dec"},
         }
+        self._suffix_to_month = {info["suffix"]: m_idx for m_idx, info in self.months_map.items()}
 
-    def _load_pending_queue(self) -> List[Dict[str, Any]]:
-        """Carrega a fila de pendências do disco"""
-        if self.pending_queue_file.exists():
-            try:
-                with open(self.pending_queue_file, 'r', encoding='utf-8') as f:
-                    queue = json.load(f)
-                    print(f"📥 [Cache] Carregados {len(queue)} itens pendentes")
-                    return queue
-            except Exception as e:
-                print(f"⚠️ [Cache] Erro ao carregar fila: {e}")
-        return []
+        # Projeção da planilha: só as colunas que o backend usa (as demais ficam no SharePoint)
+        self.workbook_columns, self.workbook_text_columns = self._workbook_schema()
+
+    def _workbook_schema(self) -> Tuple[List[str], List[str]]:
+        """Colunas lidas do workbook (nomes já sem espaços) e quais delas são sempre texto"""
+        text_columns = ['Title', '指标名称 Indicator name', '口径 KPI description', 'Type', 'type', '单位 Units']
+        columns = ['序号 No.', '2024 年度成果  Annual Results 2024',
+                   '2025年目标 Basic Target in 2025', '2025年目标 ChallengeTarget in 2025']
+        for info in self.months_map.values():
+            suffix = info["suffix"]
+            columns.append(info["target"])
+            # Colunas editadas pelo app recebem texto: object desde o ingest (um mês vazio viria float64)
+            text_columns += [f"Achieved {suffix}", f"Justification - {suffix}", f"Countermeasure - {suffix}",
+                             f"Responsible - {suffix}", f"Countermeasure Date - {suffix}"]
+        return text_columns + columns, text_columns
+
+    def _read_workbook(self, source, sheet_name) -> pd.DataFrame:
+        return read_workbook(source, sheet_name, self.workbook_columns, self.workbook_text_columns)
+
+    def _full_workbook(self, df: pd.DataFrame, content: bytes) -> pd.DataFrame:
+        """Workbook completo (todas as colunas do SharePoint) com as colunas do cache por cima"""
+        full = pd.read_excel(io.BytesIO(content), sheet_name="Sheet1", engine=EXCEL_ENGINE)
+        return overlay_columns(full, df)
+
+    def _mark_dirty(self, df: pd.DataFrame, row_pos: int, columns: Iterable[str]):
+        """Registra células alteradas em memória que ainda não subiram para o SharePoint"""
+        title = df['Title'].iat[row_pos] if 'Title' in df.columns else None
+        key = row_key(title, df['序号 No.'].iat[row_pos])
+        with self._dirty_lock:
+            self._dirty_cells.setdefault(key, set()).update(columns)
 
-    def _save_pending_queue(self):
-        """Salva a fila de pendências no disco"""
+    def _dirty_edits(self, state: CacheState, dirty: Dict[Tuple[str, str], set]) -> Optional[Dict[Tuple[str, str], Dict[str, Any]]]:
+        """Valores atuais (do estado publicado) das células sujas; None se alguma linha sumiu"""
+        numbers = state.df['序号 No.']
+        edits = {}
+        for key, columns in dirty.items():
+            positions = state.sector_index.get(key[0], np.empty(0, dtype=np.intp)).tolist()
+            row_pos = next((p for p in positions if row_key(key[0], numbers.iat[p])[1] == key[1]), None)
+            if row_pos is None:
+                return None
+            edits[key] = {col: state.df[col].iat[row_pos] for col in columns}
+        return edits
+
+    def _load_pending_queue(self) -> PendingQueue:
+        """Carrega a fila de pendências do disco (JSON base + log de operações)"""
         try:
-            with open(self.pending_queue_file, 'w', encoding='utf-8') as f:
-                json.dump(self.pending_queue, f, indent=2, ensure_ascii=False)
-            print(f"💾 [Cache] Fila salva: {len(self.pending_queue)} itens pendentes")
+            queue = PendingQueue(self.pending_queue_file)
         except Exception as e:
-            print(f"❌ [Cache] Erro ao salvar fila: {e}")
+            log.warning(f"⚠️ [Cache] Erro ao carregar fila: {e}")
+            # Preserva o arquivo ilegível para inspeção e começa uma fila vazia
+            for path in (self.pending_queue_file, self.pending_queue_file.with_suffix(".log")):
+                if path.exists():
+                    os.replace(path, path.with_name(path.name + ".corrupt"))
+            queue = PendingQueue(self.pending_queue_file)
+        if len(queue):
+            log.info(f"📥 [Cache] Carregados {len(queue)} itens pendentes")
+        return queue
 
     def _add_to_pending_queue(self, kpi: KPI, sector: str):
         """Adiciona um KPI à fila de pendências"""
@@ -86,20 +234,9 @@ class SharePointBackend:
             }
         }
         
-        # Remove duplicatas antigas do mesmo KPI
-        self.pending_queue = [
-            item for item in self.pending_queue 
-            if not (item["kpi_id"] == kpi.id and item["sector"] == sector and item["month_suffix"] == suffix)
-        ]
-        
-        # Adiciona novo item
-        self.pending_queue.append(pending_item)
-        self._save_pending_queue()
-        print(f"📝 [Cache] KPI {kpi.id} ({kpi.name}) adicionado à fila")
-
-    def _get_context(self):
-        credentials = ClientCredential(self.client_id, self.client_secret)
-        return ClientContext(self.site_url).with_credentials(credentials)
+        # Substitui a pendência anterior do mesmo KPI (uma linha no log, não a fila inteira)
+        self.pending_queue.upsert(pending_item)
+        log.debug(f"📝 [Cache] KPI {kpi.id} ({kpi.name}) adicionado à fila ({len(self.pending_queue)} pendentes)")
 
     def _calculate_periods(self):
         today = date.today()
@@ -115,125 +252,657 @@ class SharePointBackend:
         if "LOWER" in clean_str: return KPIType.LOWER_THAN
         return KPIType.GREATER_THAN
 
+    @staticmethod
+    def _clean_value(val) -> str:
+        """Célula -> texto: nulos viram vazio e números inteiros perdem o .0"""
+        try:
+            if pd.isna(val): return ""
+            if isinstance(val, (float, int)): return str(int(val)) if float(val).is_integer() else str(val)
+            return str(val)
+        except Exception as e:
+            log.warning(f"⚠️ Erro ao limpar valor: {val} - {e}")
+            return ""
+
+    @classmethod
+    def _clean_column(cls, df: pd.DataFrame, col: str) -> List[str]:
+        """Aplica _clean_value a uma coluna inteira (colunas float são tratadas com NumPy)"""
+        if col not in df.columns:
+            return [""] * len(df)
+        series = df[col]
+        if pd.api.types.is_float_dtype(series.dtype):
+            arr = series.to_numpy(dtype=np.float64, na_value=np.nan)
+            out = np.full(len(arr), "", dtype=object)
+            missing = np.isnan(arr)
+            integral = ~missing & np.isfinite(arr) & (np.trunc(arr) == arr) & (np.abs(arr) < 2 ** 63)
+            out[integral] = arr[integral].astype(np.int64).astype(str).tolist()
+            rest = ~missing & ~integral
+            out[rest] = [cls._clean_value(v) for v in arr[rest].tolist()]
+            return out.tolist()
+
+        values = series.to_numpy(dtype=object)
+        out = np.full(len(values), "", dtype=object)
+        present = ~pd.isna(values)
+        out[present] = [v if type(v) is str else cls._clean_value(v) for v in values[present].tolist()]
+        return out.tolist()
+
+    @staticmethod
+    def _column_as_str(df: pd.DataFrame, col: str, default) -> List[str]:
+        """Equivalente colunar de str(row.get(col, default))"""
+        if col not in df.columns:
+            return [str(default)] * len(df)
+        return list(map(str, df[col].tolist()))
+
+    @staticmethod
+    def _coalesce_columns(df: pd.DataFrame, cols: List[str], default) -> List[Any]:
+        """Equivalente colunar de row.get(a) or row.get(b) or default"""
+        values = [default] * len(df)
+        for col in reversed(cols):
+            if col in df.columns:
+                values = [v or fallback for v, fallback in zip(df[col].tolist(), values)]
+        return values
+
+    @staticmethod
+    def _normalize_sector(sector: str) -> str:
+        return str(sector).strip().lower()
+
+    @staticmethod
+    def _build_sector_index(df: pd.DataFrame) -> Tuple[Dict[str, np.ndarray], List[str]]:
+        """
+        Monta o índice setor -> posições das linhas uma única vez por refresh.
+        As colunas de Title nunca são alteradas por save_kpi / fila de pendências,
+        então o índice permanece válido até o próximo download.
+        """
+        if 'Title' not in df.columns:
+            return {}, []
+
+        titles = df['Title'].fillna('').astype(str).str.strip()
+        keys = titles.str.lower()
+        sector_index = {
+            key: np.asarray(positions, dtype=np.intp)
+            for key, positions in keys.groupby(keys.to_numpy(), sort=False).indices.items()
+        }
+        return sector_index, sorted([s for s in titles.unique() if s])
+
+    @staticmethod
+    def _build_row_index(df: pd.DataFrame) -> Tuple[Dict[Tuple[str, str], int], Dict[str, int], List[Tuple[str, str]]]:
+        """Chave primária (setor normalizado, 序号 No.) -> linha, montada uma vez por refresh"""
+        if '序号 No.' not in df.columns:
+            return {}, {}, []
+        if 'Title' in df.columns:
+            sector_keys = df['Title'].fillna('').astype(str).str.strip().str.lower().to_numpy()
+        else:
+            sector_keys = np.full(len(df), "", dtype=object)
+        ids = df['序号 No.'].astype(str).to_numpy()
+        positions = np.arange(len(df))
+
+        keys = pd.MultiIndex.from_arrays([sector_keys, ids])
+        first = ~keys.duplicated()
+        first_id = ~pd.Index(ids).duplicated()
+        row_index = dict(zip(keys[first], positions[first].tolist()))
+        id_index = dict(zip(ids[first_id].tolist(), positions[first_id].tolist()))
+        return row_index, id_index, list(dict.fromkeys(keys[~first]))
+
+    def _find_row(self, state: CacheState, sector: Optional[str], kpi_id) -> Optional[int]:
+        """Linha do KPI em O(1); sem setor, cai na primeira linha com aquele 序号 No."""
+        if sector:
+            return state.row_index.get((self._normalize_sector(sector), str(kpi_id)))
+        return state.id_index.get(str(kpi_id))
+
+    def _get_sector_positions(self, state: CacheState, sector: str) -> np.ndarray:
+        """Posições (iloc) das linhas do setor, via índice pré-calculado"""
+        return state.sector_index.get(self._normalize_sector(sector), np.empty(0, dtype=np.intp))
+
+    def _get_sector_view(self, state: CacheState, sector: Optional[str]) -> pd.DataFrame:
+        """Retorna as linhas do setor com um take posicional O(k)"""
+        if not sector or 'Title' not in state.df.columns:
+            return state.df
+        return state.df.take(self._get_sector_positions(state, sector))
+
+    def _row_sector_key(self, state: CacheState, row_pos: int) -> Optional[str]:
+        """Setor normalizado de uma linha (mesma chave usada no índice)"""
+        if 'Title' not in state.df.columns:
+            return None
+        title = state.df['Title'].iat[row_pos]
+        return self._normalize_sector('' if pd.isna(title) else title)
+
+    def _get_view_positions(self, state: CacheState, sector: Optional[str]) -> np.ndarray:
+        """Mesmo filtro de _get_sector_view, mas devolvendo só as posições"""
+        if not sector or 'Title' not in state.df.columns:
+            return np.arange(len(state.df))
+        return self._get_sector_positions(state, sector)
+
+    def _build_historic_matrix(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """
+        Parseia uma única vez (por refresh) as 12 colunas de Achieved e de target
+        em matrizes float64 com máscara de validade, além dos campos fixos do
+        histórico. load_historic_data passa a ser apenas um recorte dessas arrays.
+        """
+        months = range(1, 13)
+        actual = parse_numeric(columns_matrix(df, [f"Achieved {self.months_map[m]['suffix']}" for m in months]))
+        target = parse_numeric(columns_matrix(df, [self.months_map[m]['target'] for m in months]))
+
+        if '序号 No.' in df.columns:
+            ids = self._column_as_str(df, '序号 No.', None)
+        else:
+            ids = list(map(str, df.index.tolist()))
+        type_strings = list(map(str, self._coalesce_columns(df, ['Type'], 'GREATER THAN')))
+        parsed_types = {t: self._parse_kpi_type(t) for t in set(type_strings)}
+        static = parse_numeric(columns_matrix(df, [
+            '2024 年度成果  Annual Results 2024',
+            '2025年目标 Basic Target in 2025',
+            '2025年目标 ChallengeTarget in 2025',
+        ])).display
+
+        return {
+            "id": ids,
+            "name": self._column_as_str(df, '指标名称 Indicator name', 'Unnamed KPI'),
+            "type": [parsed_types[t] for t in type_strings],
+            "type_code": np.array([TYPE_CODES[parsed_types[t]] for t in type_strings], dtype=np.int8),
+            "unit": list(map(str, self._coalesce_columns(df, ['单位 Units'], "-"))),
+            "res_2024": static[:, 0].tolist(),
+            "target_2025": static[:, 1].tolist(),
+            "challenge_2025": static[:, 2].tolist(),
+            "actual": actual,
+            "target": target,
+            "ytd": self._compute_ytd_display(actual),
+        }
+
+    @staticmethod
+    def _compute_ytd_display(actual: NumericCells) -> List[str]:
+        """YTD = soma (em ordem de mês) das células válidas; "-" se nenhuma"""
+        if actual.value.shape[0] == 0:
+            return []
+        # cumsum soma da esquerda para a direita, exatamente como o loop antigo
+        ytd_sum = np.cumsum(np.where(actual.ok, actual.value, 0.0), axis=1)[:, -1]
+        has_ytd = actual.ok.any(axis=1)
+        return parse_numeric(np.where(has_ytd, ytd_sum.astype(object), None)).display.tolist()
+
+    def _historic_with_cells(self, historic: Dict[str, Any], suffix: str, cells: List[Tuple[int, Any]]) -> Dict[str, Any]:
+        """Cópia das matrizes do histórico com as células de Achieved (e o YTD das linhas) atualizadas"""
+        m_idx = self._suffix_to_month[suffix]
+        actual = historic["actual"].copy()
+        for row_pos, raw_value in cells:
+            actual.set_cell((row_pos, m_idx - 1), raw_value)
+        rows = np.array(sorted({row_pos for row_pos, _ in cells}), dtype=np.intp)
+        ytd = list(historic["ytd"])
+        for row_pos, display in zip(rows.tolist(), self._compute_ytd_display(actual.take(rows))):
+            ytd[row_pos] = display
+        return dict(historic, actual=actual, ytd=ytd)
+
+    @staticmethod
+    def _frame_with_cells(df: pd.DataFrame, edits: List[Tuple[int, Dict[str, Any]]]) -> pd.DataFrame:
+        """Copy-on-write de um frame: só as colunas alteradas são copiadas (uma vez), o resto é compartilhado"""
+        by_column: Dict[str, List[Tuple[int, Any]]] = {}
+        for row_pos, updates in edits:
+            for col, value in updates.items():
+                by_column.setdefault(col, []).append((row_pos, value))
+
+        new_df = df.copy(deep=False)
+        for col, cells in by_column.items():
+            # object: valores digitados são texto (float64 recusaria "95%" no pandas 3)
+            column = df[col].to_numpy(dtype=object, copy=True) if col in df.columns else np.full(len(df), np.nan, dtype=object)
+            for row_pos, value in cells:
+                column[row_pos] = value
+            new_df[col] = column
+        return new_df
+
+    def _bump_data_version(self, sector_key: Optional[str] = None):
+        """
+        Sem setor (refresh): nova geração, toda a memoização é descartada.
+        Com setor (save_kpi): invalida apenas as entradas daquele setor
+        (e da view sem filtro, que contém todos os setores).
+        """
+        with self._view_cache_lock:
+            self.data_version += 1
+            if sector_key is None:
+                self._refresh_generation += 1
+                self._sector_edit_versions.clear()
+                self._view_cache.clear()
+                return
+
+            self._sector_edit_versions[sector_key] = self._sector_edit_versions.get(sector_key, 0) + 1
+            for key in [k for k in self._view_cache if k[1] in (sector_key, "")]:
+                del self._view_cache[key]
+
+    def _view_cache_key(self, kind: str, sector: Optional[str]) -> Tuple:
+        # Leitores calculam a chave ANTES de ler self._state: como _publish_state troca o
+        # estado antes de mudar a versão, um estado novo nunca fica guardado sob versão antiga
+        sector_key = self._normalize_sector(sector) if sector else ""
+        eval_date, _ = self._calculate_periods()
+        if sector_key:
+            version = (self._refresh_generation, self._sector_edit_versions.get(sector_key, 0))
+        else:
+            version = (self._refresh_generation, self.data_version)
+        return (kind, sector_key, eval_date.month, version)
+
+    def _view_cache_get(self, key: Tuple):
+        with self._view_cache_lock:
+            value = self._view_cache.get(key)
+            if value is not None:
+                self._view_cache.move_to_end(key)
+        metrics.inc("kpi_view_cache_total", help="Consultas ao cache de views por resultado",
+                    kind=key[0], result="hit" if value is not None else "miss")
+        return value
+
+    def _view_cache_put(self, key: Tuple, value):
+        with self._view_cache_lock:
+            self._view_cache[key] = value
+            self._view_cache.move_to_end(key)
+            while len(self._view_cache) > self.view_cache_max_entries:
+                self._view_cache.popitem(last=False)
+
+    @property
+    def df_cache(self) -> Optional[pd.DataFrame]:
+        state = self._state
+        return state.df if state is not None else None
+
     def _refresh_cache_if_needed(self, force=False):
         """
         Lógica inteligente de cache:
-        1. Se não tem cache (primeira execução) -> Baixa
-        2. Se o cache venceu (passou 15 min) -> Baixa
+        1. Se não tem cache (primeira execução) -> Snapshot local + atualização em background
+        2. Se o cache venceu (passou 15 min) -> Baixa (ou, em stale-while-revalidate, atualiza em background)
         3. Se force=True (botão clicado) -> Baixa
         4. Após baixar, processa fila de pendências
         5. Faz merge inteligente (SharePoint = verdade, cache preenche vazios)
         """
+        requested_at = time.monotonic()
+
+        # Warm start: serve o snapshot local em milissegundos e revalida em background
+        if self._state is None and not force:
+            with self._refresh_lock:
+                # Outra sessão pode ter carregado os dados enquanto esperávamos
+                if self._state is None and self._load_snapshot():
+                    self._start_background_refresh()
+                    return
+
         current_time = time.time()
         is_expired = (current_time - self.last_fetch_time) > self.cache_validity_seconds
 
-        if self.df_cache is None or is_expired or force:
+        if self._state is not None and is_expired and not force and self.stale_while_revalidate:
+            # Dados vencidos continuam sendo servidos; só uma thread busca o SharePoint
+            self._start_background_refresh()
+            return
+
+        if self._state is None or is_expired or force:
             trigger = "Forçado" if force else ("Expirado" if is_expired else "Inicial")
-            print(f"🔄 [Backend] Atualizando dados ({trigger})...")
+            log.info(f"🔄 [Backend] Atualizando dados ({trigger})...")
+            self._refresh_from_source(force=force, requested_at=requested_at)
 
-            # Prioridade 1: SharePoint sempre (verdade universal)
-            # Prioridade 2: Se falhar, arquivo local
-            try:
-                self._download_from_sharepoint()
-            except Exception as e:
-                print(f"⚠️ [Backend] SharePoint falhou, tentando arquivo local: {e}")
-                if os.path.exists(self.local_file_name):
-                    print(f"📂 [Backend] Lendo arquivo LOCAL: {self.local_file_name}")
-                    self.df_cache = pd.read_excel(self.local_file_name, sheet_name=0)
+    def _refresh_from_source(self, force: bool = False, requested_at: Optional[float] = None):
+        """
+        Prioridade 1: SharePoint sempre (verdade universal)
+        Prioridade 2: Se falhar, mantém o que já está em memória / snapshot / arquivo local
+        O novo frame e seus índices são montados fora do estado publicado e trocados de uma vez.
+        """
+        if requested_at is None:
+            requested_at = time.monotonic()
+
+        with self._refresh_lock:
+            # Um fetch terminou enquanto esperávamos o lock: o resultado dele já serve
+            if self._state is not None and self._last_refresh_completed >= requested_at:
+                log.debug("⏭️ [Backend] Refresh concorrente já concluído, reaproveitando")
+                return
+            if (force and self._state is not None
+                    and time.monotonic() - self._last_refresh_completed < self.min_force_refresh_interval):
+                log.info(f"⏭️ [Backend] Refresh forçado ignorado (último há menos de {self.min_force_refresh_interval}s)")
+                return
+            self._fetch_and_publish()
+            self._last_refresh_completed = time.monotonic()
+
+    def _fetch_and_publish(self):
+        """Corpo do refresh; só roda com _refresh_lock adquirido"""
+        try:
+            upload_generation = self._upload_generation
+            with metrics.span("refresh"):
+                result = self._fetch_from_sharepoint()
+            with self._write_lock:
+                if self._upload_generation != upload_generation:
+                    # Um upload terminou durante o download: o arquivo baixado pode ser anterior
+                    # a ele (sem a edição, que já saiu da fila). Memória e _remote_* já estão certos
+                    result = {"changed": False, "superseded": True}
                 else:
-                    print(f"❌ [Backend] Nenhuma fonte disponível!")
-                    self.df_cache = pd.DataFrame()
+                    self._remote_metadata = result["metadata"]
+                metrics.inc("kpi_refresh_total", help="Refreshes por resultado",
+                            result="superseded" if result.get("superseded")
+                            else "changed" if result["changed"] else "unchanged")
+                if result["changed"]:
+                    # Merge da fila + publicação sob o lock de escrita: um save_kpi concorrente
+                    # entra na fila antes do merge ou é aplicado depois, nunca se perde na troca
+                    state = self._prepare_state(result["df"], result["fetched_at"])
+                    self._remote_content_hash = result["content_hash"]
+                    self._remote_bytes = result["content"]
+                    self._publish_state(state)
+                elif result.get("superseded"):
+                    log.info("⏭️ [Backend] Upload concluído durante o refresh, download descartado")
+                elif self._state is not None:
+                    # Nada mudou no SharePoint: os dados em memória estão confirmados agora
+                    self._state = replace(self._state, fetched_at=time.time())
+                    if result.get("content") is not None:
+                        self._remote_bytes = result["content"]
+            if result["changed"]:
+                self._save_snapshot()
+        except Exception as e:
+            metrics.inc("kpi_refresh_total", result="error")
+            log.warning(f"⚠️ [Backend] SharePoint falhou, usando dados locais: {e}")
+            if self._state is None and not self._load_snapshot():
+                self._load_local_excel()
 
-            # Limpeza básica de colunas
-            if self.df_cache is not None:
-                self.df_cache.columns = self.df_cache.columns.str.strip()
-                
-                # 🆕 Processa fila de pendências após baixar dados frescos
-                self._process_pending_queue()
+        # Atualiza o timestamp
+        self.last_fetch_time = time.time()
+
+    def _prepare_state(self, df: pd.DataFrame, fetched_at: float, merge_pending: bool = True,
+                       replay_after: Optional[int] = None, uploaded_seq: Optional[int] = None) -> CacheState:
+        """Pós-processamento de todo frame novo: colunas, índice, fila de pendências e matrizes"""
+        df.columns = df.columns.str.strip()
+        sector_index, available_sectors = self._build_sector_index(df)
+        row_index, id_index, duplicate_keys = self._build_row_index(df)
+        if duplicate_keys:
+            sample = ", ".join(f"{sector}/{kpi_id}" for sector, kpi_id in duplicate_keys[:5])
+            log.warning(f"⚠️ [Backend] {len(duplicate_keys)} chaves (setor, No.) duplicadas na planilha, "
+                        f"escritas vão para a primeira linha: {sample}")
+
+        # Snapshot: reaplica as edições do journal posteriores a ele
+        if replay_after is not None:
+            self._replay_journal(df, row_index, replay_after, replay_after if uploaded_seq is None else uploaded_seq)
+
+        # 🆕 Processa fila de pendências após baixar dados frescos
+        if merge_pending:
+            with metrics.span("pending_merge"):
+                self._process_pending_queue(df, row_index)
+        with metrics.span("historic_matrix"):
+            historic = self._build_historic_matrix(df)
+        with metrics.span("status_cube"):
+            cube = StatusCube.build(historic["actual"], historic["target"], historic["type_code"], sector_index)
+        return CacheState(df=df, sector_index=sector_index, available_sectors=available_sectors,
+                          historic=historic, cube=cube, fetched_at=fetched_at,
+                          row_index=row_index, id_index=id_index, duplicate_keys=duplicate_keys)
+
+    def _replay_journal(self, df: pd.DataFrame, row_index: Dict[Tuple[str, str], int], after_seq: int,
+                        uploaded_seq: int):
+        """
+        Reaplica (em ordem) as edições gravadas no journal depois do snapshot e marca como sujas
+        todas as que ainda não subiram (inclusive as que o snapshot já contém)
+        """
+        records = self._journal.records_after(min(after_seq, uploaded_seq))
+        if not records:
+            return
+        replayed = sum(record["seq"] > after_seq for record in records)
+        log.info(f"📜 [Cache] Reaplicando {replayed} edições do journal sobre o snapshot "
+                 f"({len(records)} ainda não enviadas)")
+        for record in records:
+            row_pos = row_index.get((record["sector"], str(record["kpi_id"])))
+            if row_pos is None:
+                log.warning(f"⚠️ [Cache] KPI {record['kpi_id']} do journal não encontrado no snapshot")
+                continue
+            if record["seq"] > after_seq:
+                for col, value in record["fields"].items():
+                    self._assign_cells(df, col, np.array([row_pos]), [value])
+            # Ainda podem não ter subido: entram no próximo patch
+            self._mark_dirty(df, row_pos, record["fields"])
+
+    def _publish_state(self, state: CacheState, sector_key: Optional[str] = None):
+        """Troca atômica: leitores veem o estado antigo inteiro ou o novo inteiro"""
+        with self._write_lock:
+            self._state = state
+            self._bump_data_version(sector_key)
+
+    def _load_local_excel(self):
+        """Último recurso offline: o xlsx local legado (se existir)"""
+        self._remote_metadata = None
+        self._remote_content_hash = None
+        self._remote_bytes = None
+        if os.path.exists(self.local_file_name):
+            log.info(f"📂 [Backend] Lendo arquivo LOCAL: {self.local_file_name}")
+            df = self._read_workbook(self.local_file_name, 0)
+            fetched_at = os.path.getmtime(self.local_file_name)
+        else:
+            log.error(f"❌ [Backend] Nenhuma fonte disponível!")
+            df = pd.DataFrame()
+            fetched_at = time.time()
+        self._publish_state(self._prepare_state(df, fetched_at))
+
+    def _save_snapshot(self):
+        """Grava df_cache + metadados do SharePoint no snapshot colunar local e compacta o journal"""
+        with self._write_lock:
+            # Estado e seq do journal lidos juntos: o snapshot contém exatamente as edições até journal_seq
+            state = self._state
+            journal_seq = self._journal.last_seq
+            uploaded_seq = self._uploaded_seq
+        if state is None:
+            return
+        try:
+            with self._snapshot_lock, metrics.span("serialize", target="snapshot"):
+                fmt = save_snapshot(self.cache_dir, state.df, {
+                    "remote_metadata": self._remote_metadata,
+                    "content_hash": self._remote_content_hash,
+                    "fetched_at": state.fetched_at,
+                    "data_version": self.data_version,
+                    "journal_seq": journal_seq,
+                    "uploaded_seq": uploaded_seq,
+                })
+                # Só descarta o que já está no snapshot E no SharePoint
+                self._journal.compact(min(journal_seq, uploaded_seq))
+                self._snapshot_seq = journal_seq
+            log.info(f"💾 [Cache] Snapshot local salvo ({fmt})")
+        except Exception as e:
+            log.warning(f"⚠️ [Cache] Erro ao salvar snapshot: {e}")
+
+    def _load_snapshot(self) -> bool:
+        """
+        Carrega o snapshot local e reaplica o journal de edições posteriores a ele.
+        A fila de pendências não é reaplicada: as edições locais já estão no snapshot
+        ou no journal, e os itens continuam na fila até subirem.
+        """
+        try:
+            with metrics.span("deserialize", target="snapshot"):
+                loaded = load_snapshot(self.cache_dir)
+        except Exception as e:
+            log.warning(f"⚠️ [Cache] Snapshot ilegível, ignorando: {e}")
+            return False
+        if loaded is None:
+            return False
 
-            # Atualiza o timestamp
-            self.last_fetch_time = time.time()
+        df, meta = loaded
+        self._remote_metadata = meta.get("remote_metadata")
+        self._remote_content_hash = meta.get("content_hash")
+        self._remote_bytes = None
+        journal_seq = meta.get("journal_seq", 0)
+        # Snapshots antigos não têm uploaded_seq: o journal deles já foi compactado até journal_seq
+        self._uploaded_seq = meta.get("uploaded_seq", journal_seq)
+        self._snapshot_seq = journal_seq
+        self._publish_state(self._prepare_state(df, meta.get("fetched_at") or time.time(), merge_pending=False,
+                                                replay_after=journal_seq, uploaded_seq=self._uploaded_seq))
+        self._schedule_unsent_edits()
+        self.last_fetch_time = time.time()
+        log.info(f"⚡ [Cache] Snapshot local carregado ({len(df)} linhas, formato {meta.get('format')})")
+        return True
 
-    def _process_pending_queue(self):
+    def _schedule_unsent_edits(self):
+        """
+        Edições do journal que não subiram antes de o processo parar entram no próximo lote,
+        com os itens da fila correspondentes: o upload bem-sucedido os tira da fila.
+        """
+        unsent = {(record["sector"], str(record["kpi_id"]), record["month_suffix"])
+                  for record in self._journal.records_after(self._uploaded_seq)}
+        if not unsent:
+            return
+        for item in self.pending_queue.items():
+            if (self._normalize_sector(item["sector"]), str(item["kpi_id"]), item["month_suffix"]) in unsent:
+                self._schedule_upload(item["kpi_id"], item["sector"], item["month_suffix"])
+        log.info(f"📤 [Cache] {len(unsent)} edições ainda não enviadas agendadas para upload")
+
+    def _start_background_refresh(self):
+        """Atualiza a partir do SharePoint numa thread, sem bloquear a execução atual do Streamlit"""
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        self._refresh_thread = threading.Thread(target=self._refresh_from_source,
+                                                name="kpi-background-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def get_data_timestamp(self) -> Optional[float]:
+        """Horário (epoch) em que os dados servidos foram confirmados na origem"""
+        state = self._state
+        return state.fetched_at if state is not None else None
+
+    def get_data_age_seconds(self) -> Optional[float]:
+        """Idade real dos dados servidos (em stale-while-revalidate pode passar do TTL)"""
+        fetched_at = self.get_data_timestamp()
+        return time.time() - fetched_at if fetched_at is not None else None
+
+    def get_view_version(self, sector: Optional[str] = None) -> Tuple:
+        """
+        Versão dos dados mostrados nas views do setor: muda a cada refresh e a cada save_kpi
+        no setor. Chave para caches das páginas (leia antes de carregar os dados).
+        """
+        return self._view_cache_key("", sector)[1:]
+
+    def _process_pending_queue(self, df: pd.DataFrame, row_index: Dict[Tuple[str, str], int]):
         """
         Processa a fila de pendências com lógica de merge inteligente:
         - SharePoint sempre prevalece se tiver valor
         - Cache preenche apenas se SharePoint estiver vazio
         - Remove da fila itens processados com sucesso
         """
-        if not self.pending_queue:
+        queue = self.pending_queue.items()
+        if not queue:
             return
-        
-        print(f"🔄 [Cache] Processando {len(self.pending_queue)} itens pendentes...")
-        items_processed = []
-        
-        for item in self.pending_queue:
-            try:
-                sector = item["sector"]
-                kpi_id = item["kpi_id"]
-                suffix = item["month_suffix"]
-                data = item["data"]
-                
-                # Encontra a linha no DataFrame
-                mask = (
-                    (self.df_cache['Title'].fillna('').astype(str).str.strip().str.lower() == sector.strip().lower()) &
-                    (self.df_cache['序号 No.'].astype(str) == str(kpi_id))
-                )
-                
-                if not mask.any():
-                    print(f"⚠️ [Cache] KPI {kpi_id} não encontrado no SharePoint")
-                    continue
-                
-                row_idx = self.df_cache.index[mask].tolist()[0]
-                col_achieved = f"Achieved {suffix}"
-                
-                # 🎯 LÓGICA DE MERGE: SharePoint prevalece, cache só preenche vazios
-                sp_value = self.df_cache.at[row_idx, col_achieved]
-                sp_has_value = pd.notna(sp_value) and str(sp_value).strip() != ""
-                
-                if sp_has_value:
-                    # SharePoint já tem valor → remove da fila (SharePoint prevaleceu)
-                    print(f"✅ [Cache] KPI {kpi_id}: SharePoint prevaleceu (valor={sp_value})")
-                    items_processed.append(item)
-                else:
-                    # SharePoint vazio → tenta preencher com cache
-                    cache_value = data.get("curr_value", "")
-                    if cache_value and str(cache_value).strip():
-                        print(f"📝 [Cache] KPI {kpi_id}: Aplicando cache (valor={cache_value})")
-                        self.df_cache.at[row_idx, col_achieved] = cache_value
-                        
-                        # Adiciona justificativas se existirem
-                        if data.get("justification"):
-                            self.df_cache.at[row_idx, f"Justification - {suffix}"] = data["justification"]
-                            self.df_cache.at[row_idx, f"Countermeasure - {suffix}"] = data["countermeasure"]
-                            self.df_cache.at[row_idx, f"Responsible - {suffix}"] = data["countermeasure_resp"]
-                            self.df_cache.at[row_idx, f"Countermeasure Date - {suffix}"] = data["countermeasure_date"]
-                        
-                        # Marca para remoção (será processado no próximo save/upload)
-                        items_processed.append(item)
-                    else:
-                        print(f"⚠️ [Cache] KPI {kpi_id}: Cache vazio, mantendo na fila")
-                        
-            except Exception as e:
-                print(f"❌ [Cache] Erro processando KPI {item.get('kpi_id')}: {e}")
-        
+
+        log.info(f"🔄 [Cache] Processando {len(queue)} itens pendentes...")
+        applied, superseded = self._merge_pending_items(df, row_index, queue)
+        if superseded:
+            log.info(f"✅ [Cache] {len(superseded)} itens: SharePoint prevaleceu")
+        if applied:
+            log.info(f"📝 [Cache] {len(applied)} itens: valores do cache aplicados")
+
         # Remove itens processados da fila
+        items_processed = list(applied.values()) + list(superseded.values())
         if items_processed:
-            self.pending_queue = [item for item in self.pending_queue if item not in items_processed]
-            self._save_pending_queue()
-            print(f"✨ [Cache] {len(items_processed)} itens processados e removidos da fila")
+            self.pending_queue.remove_items(items_processed)
+            log.info(f"✨ [Cache] {len(items_processed)} itens processados e removidos da fila")
+
+    def _merge_pending_items(self, df: pd.DataFrame, row_index: Dict[Tuple[str, str], int],
+                             queue: List[Dict[str, Any]]) -> Tuple[Dict[QueueKey, Dict[str, Any]], Dict[QueueKey, Dict[str, Any]]]:
+        """
+        Merge vetorizado: a fila inteira resolvida contra a chave primária (setor, KPI id) e,
+        por mês, máscaras "SharePoint tem valor" / "cache tem valor" sobre a coluna Achieved.
+        Escreve no df e retorna (aplicados, SharePoint prevaleceu), indexados pela chave da fila.
+        """
+        kpi_ids = [str(item["kpi_id"]) for item in queue]
+        items = pd.DataFrame({
+            "kpi_id": kpi_ids,
+            "suffix": [item["month_suffix"] for item in queue],
+            "item": queue,
+            "row_pos": [row_index.get((self._normalize_sector(item["sector"]), kpi_id), -1)
+                        for item, kpi_id in zip(queue, kpi_ids)],
+        })
+
+        missing = items["row_pos"] < 0
+        for kpi_id in items.loc[missing, "kpi_id"]:
+            log.warning(f"⚠️ [Cache] KPI {kpi_id} não encontrado no SharePoint")
+        items = items[~missing].astype({"row_pos": np.intp})
+
+        applied: Dict[QueueKey, Dict[str, Any]] = {}
+        superseded: Dict[QueueKey, Dict[str, Any]] = {}
+        # Itens que caem na mesma (linha, mês) são resolvidos em rodadas, na ordem da fila
+        while len(items):
+            first = ~items.duplicated(["row_pos", "suffix"])
+            for suffix, group in items[first].groupby("suffix", sort=False):
+                self._merge_month(df, suffix, group, applied, superseded)
+            items = items[~first]
+        return applied, superseded
+
+    def _merge_month(self, df: pd.DataFrame, suffix: str, group: pd.DataFrame,
+                     applied: Dict[QueueKey, Dict[str, Any]], superseded: Dict[QueueKey, Dict[str, Any]]):
+        """Aplica a regra "SharePoint prevalece, cache só preenche vazios" de um mês, em bloco"""
+        col_achieved = f"Achieved {suffix}"
+        positions = group["row_pos"].to_numpy()
+        queued = group["item"].tolist()
+
+        # 🎯 LÓGICA DE MERGE: SharePoint prevalece, cache só preenche vazios
+        if col_achieved in df.columns:
+            sp_values = pd.Series(df[col_achieved].to_numpy(dtype=object)[positions])
+            sp_has_value = (sp_values.notna() & (sp_values.astype(str).str.strip() != "")).to_numpy()
+        else:
+            sp_has_value = np.zeros(len(positions), dtype=bool)
+        data = [item.get("data") or {} for item in queued]
+        cache_values = [d.get("curr_value", "") for d in data]
+        has_cache = np.array([bool(v) and bool(str(v).strip()) for v in cache_values], dtype=bool)
+        apply = ~sp_has_value & has_cache
+
+        for item, keep in zip(queued, sp_has_value):
+            if keep:
+                superseded[PendingQueue.key(item)] = item
+        if not apply.any():
+            return
 
-    def _download_from_sharepoint(self):
-        print("☁️ [Backend] Baixando do SharePoint...")
+        apply_pos = positions[apply]
+        self._assign_cells(df, col_achieved, apply_pos, [v for v, a in zip(cache_values, apply) if a])
+
+        # Adiciona justificativas se existirem
+        with_just = np.array([bool(d.get("justification")) for d in data], dtype=bool) & apply
+        if with_just.any():
+            just_data = [d for d, j in zip(data, with_just) if j]
+            for col, field in (("Justification", "justification"), ("Countermeasure", "countermeasure"),
+                               ("Responsible", "countermeasure_resp"), ("Countermeasure Date", "countermeasure_date")):
+                self._assign_cells(df, f"{col} - {suffix}", positions[with_just], [d.get(field) for d in just_data])
+
+        just_cols = [f"Justification - {suffix}", f"Countermeasure - {suffix}",
+                     f"Responsible - {suffix}", f"Countermeasure Date - {suffix}"]
+        for item, row_pos, do_apply, just in zip(queued, positions.tolist(), apply, with_just):
+            if do_apply:
+                # Marca para remoção (será processado no próximo save/upload)
+                applied[PendingQueue.key(item)] = item
+                self._mark_dirty(df, row_pos, [col_achieved] + (just_cols if just else []))
+
+    @staticmethod
+    def _assign_cells(df: pd.DataFrame, col: str, positions: np.ndarray, values: List[Any]):
+        """Escreve vários valores numa coluna de uma vez (a coluna vira object, como o .at fazia com texto)"""
+        column = df[col].to_numpy(dtype=object, copy=True) if col in df.columns else np.full(len(df), np.nan, dtype=object)
+        column[positions] = values
+        df[col] = column
+
+    def _fetch_remote_metadata(self) -> Optional[Dict[str, Any]]:
+        """Consulta só os metadados do KPISystem.xlsx (sem baixar o conteúdo)"""
+        try:
+            with metrics.span("metadata"):
+                return self.storage.metadata()
+        except Exception as e:
+            log.warning(f"⚠️ [Backend] Não foi possível ler metadados do {self.storage.name}: {e}")
+            return None
+
+    def _fetch_from_sharepoint(self) -> Dict[str, Any]:
+        """
+        Download condicional do SharePoint, sem alterar o estado publicado
+        (pode rodar numa thread de revalidação). "changed" indica se há um frame novo.
+        """
+        log.info("☁️ [Backend] Verificando SharePoint...")
         try:
-            ctx = self._get_context()
-            response = io.BytesIO()
-            ctx.web.get_file_by_server_relative_path(self.remote_file_url).download(response).execute_query()
-            response.seek(0)
-            self.df_cache = pd.read_excel(response, sheet_name="Sheet1")
-            print("✅ [Backend] Download do SharePoint concluído!")
+            # 1. Metadados iguais (ETag / data / tamanho) -> nem baixa
+            #    (depois do warm start pelo snapshot baixa uma vez: é a base dos uploads por patch)
+            metadata = self._fetch_remote_metadata()
+            if self.df_cache is not None and metadata is not None and metadata == self._remote_metadata \
+                    and self._remote_bytes is not None:
+                log.info(f"✅ [Backend] {self.storage.name} sem alterações (ETag {metadata.get('etag')}), cache reaproveitado")
+                return {"changed": False, "metadata": metadata}
+
+            log.info(f"☁️ [Backend] Baixando do {self.storage.name}...")
+            with metrics.span("download"):
+                content = self.storage.download()
+            metrics.inc("kpi_downloaded_bytes_total", len(content), help="Bytes baixados do armazenamento")
+            content_hash = hashlib.sha256(content).hexdigest()
+
+            # 2. Bytes idênticos ao último arquivo parseado -> pula o read_excel
+            if self.df_cache is not None and content_hash == self._remote_content_hash:
+                log.info("✅ [Backend] Conteúdo idêntico ao cache, parse ignorado")
+                return {"changed": False, "metadata": metadata, "content": content}
+
+            with metrics.span("parse"):
+                df = self._read_workbook(io.BytesIO(content), "Sheet1")
+            log.info("✅ [Backend] Download do SharePoint concluído!")
+            return {"changed": True, "metadata": metadata, "content_hash": content_hash,
+                    "content": content, "df": df, "fetched_at": time.time()}
         except Exception as e:
-            print(f"❌ [Backend] Erro crítico no download: {e}")
+            log.error(f"❌ [Backend] Erro crítico no download: {e}")
             raise  # Re-lança exceção para fallback funcionar
 
     def force_refresh_from_sharepoint(self) -> bool:
@@ -241,122 +910,169 @@ class SharePointBackend:
         Força atualização dos dados do SharePoint (botão manual).
         Retorna True se sucesso, False se falhar.
         """
-        print("🔄 [Backend] Refresh manual solicitado...")
+        log.info("🔄 [Backend] Refresh manual solicitado...")
         try:
             self._refresh_cache_if_needed(force=True)
-            print(f"✅ [Backend] Dados atualizados! Fila: {len(self.pending_queue)} pendentes")
+            log.info(f"✅ [Backend] Dados atualizados! Fila: {len(self.pending_queue)} pendentes")
             return True
         except Exception as e:
-            print(f"❌ [Backend] Erro no refresh: {e}")
+            log.error(f"❌ [Backend] Erro no refresh: {e}")
             return False
 
+    def export_to_excel(self, path: Optional[str] = None) -> str:
+        """Exporta o cache atual para xlsx sob demanda (o dia a dia usa o snapshot local)"""
+        self._refresh_cache_if_needed()
+        target = path or self.local_file_name
+        df = self.df_cache
+        if self._remote_bytes is not None:
+            df = self._full_workbook(df, self._remote_bytes)
+        else:
+            log.warning("⚠️ [Backend] Sem cópia do workbook original, exportando só as colunas do cache")
+        df.to_excel(target, index=False)
+        log.info(f"📤 [Backend] Cache exportado para {target}")
+        return target
+
     def get_pending_count(self) -> int:
         """Retorna quantidade de itens na fila de pendências"""
         return len(self.pending_queue)
 
     def get_available_sectors(self, force_refresh=False) -> List[str]:
         self._refresh_cache_if_needed(force=force_refresh)
-        if self.df_cache is None or 'Title' not in self.df_cache.columns: return []
-        try:
-            sectors = self.df_cache['Title'].dropna().astype(str).str.strip().unique()
-            return sorted([s for s in sectors if s])
-        except Exception as e:
-            return []
+        state = self._state
+        if state is None or 'Title' not in state.df.columns: return []
+        return list(state.available_sectors)
 
     def load_data(self, sector: str = None, force_refresh=False) -> List[KPI]:
         self._refresh_cache_if_needed(force=force_refresh)
-        df_view = self.df_cache
-        if sector and 'Title' in self.df_cache.columns:
-            df_view = self.df_cache[
-                self.df_cache['Title'].fillna('').astype(str).str.strip().str.lower() == sector.strip().lower()]
 
-        print(f"🔍 Setor: {sector}, Linhas encontradas: {len(df_view)}")
+        # As páginas alteram os KPIs (ex.: curr_value do text_input), então devolvemos cópias
+        cache_key = self._view_cache_key("kpis", sector)
+        cached = self._view_cache_get(cache_key)
+        if cached is not None:
+            return [copy.copy(kpi) for kpi in cached]
+
+        build_start = time.perf_counter()
+        state = self._state
+        df_view = self._get_sector_view(state, sector)
+
+        log.debug(f"🔍 Setor: {sector}, Linhas encontradas: {len(df_view)}")
         eval_date, prev_date = self._calculate_periods()
         curr_info = self.months_map[eval_date.month]
         prev_info = self.months_map[prev_date.month]
-        kpi_list = []
-
-        print(f"⏳ Iniciando processamento de {len(df_view)} linhas...")
-        for idx_count, (index, row) in enumerate(df_view.iterrows()):
-            if idx_count % 10 == 0:  # Log a cada 10 linhas
-                print(f"📊 Processando linha {idx_count}/{len(df_view)}...")
-            kpi_type = self._parse_kpi_type(str(row.get('Type') or row.get('type') or 'GREATER THAN'))
-
-            def clean_val(val):
-                try:
-                    if pd.isna(val): return ""
-                    if isinstance(val, (float, int)): return str(int(val)) if float(val).is_integer() else str(val)
-                    return str(val)
-                except Exception as e:
-                    print(f"⚠️ Erro ao limpar valor: {val} - {e}")
-                    return ""
-
-            kpi = KPI(
-                id=str(row.get('序号 No.', index)),
-                name=str(row.get('指标名称 Indicator name', 'Unnamed KPI')),
-                description=str(row.get(' 口径 KPI description') or row.get('口径 KPI description') or ""),
-                type=kpi_type,
-                prev_target=str(row.get(prev_info['target'], 0)),
-                prev_achieved=str(row.get(f"Achieved {prev_info['suffix']}", 0)),
-                curr_target=str(row.get(curr_info['target'], 0)),
-                curr_value=clean_val(row.get(f"Achieved {curr_info['suffix']}")),
-                justification=clean_val(row.get(f"Justification - {curr_info['suffix']}")),
-                countermeasure=clean_val(row.get(f"Countermeasure - {curr_info['suffix']}")),
-                countermeasure_date=clean_val(row.get(f"Countermeasure Date - {curr_info['suffix']}")),
-                countermeasure_resp=clean_val(row.get(f"Responsible - {curr_info['suffix']}"))
-            )
-            kpi_list.append(kpi)
-        
-        print(f"✅ Processamento concluído! {len(kpi_list)} KPIs carregados para '{sector}'")
-        return kpi_list
+
+        # Resolve as colunas uma única vez e monta os KPIs coluna a coluna
+        if '序号 No.' in df_view.columns:
+            ids = self._column_as_str(df_view, '序号 No.', None)
+        else:
+            ids = list(map(str, df_view.index.tolist()))
+        type_strings = list(map(str, self._coalesce_columns(df_view, ['Type', 'type'], 'GREATER THAN')))
+        parsed_types = {t: self._parse_kpi_type(t) for t in set(type_strings)}
+        curr_suffix = curr_info['suffix']
+        # Status já avaliados no refresh (nenhum parse aqui)
+        status = state.cube.status[self._get_view_positions(state, sector)]
+
+        # Mesma ordem dos campos do dataclass KPI
+        columns = [
+            ids,
+            self._column_as_str(df_view, '指标名称 Indicator name', 'Unnamed KPI'),
+            list(map(str, self._coalesce_columns(df_view, [' 口径 KPI description', '口径 KPI description'], ""))),
+            [parsed_types[t] for t in type_strings],
+            self._column_as_str(df_view, prev_info['target'], 0),
+            self._column_as_str(df_view, f"Achieved {prev_info['suffix']}", 0),
+            self._column_as_str(df_view, curr_info['target'], 0),
+            self._clean_column(df_view, f"Achieved {curr_suffix}"),
+            self._clean_column(df_view, f"Justification - {curr_suffix}"),
+            self._clean_column(df_view, f"Countermeasure - {curr_suffix}"),
+            self._clean_column(df_view, f"Countermeasure Date - {curr_suffix}"),
+            self._clean_column(df_view, f"Responsible - {curr_suffix}"),
+            status[:, prev_date.month - 1].tolist(),
+            status[:, eval_date.month - 1].tolist(),
+        ]
+        kpi_list = [KPI(*fields) for fields in zip(*columns)]
+
+        log.debug(f"✅ Processamento concluído! {len(kpi_list)} KPIs carregados para '{sector}'")
+        metrics.observe("view_build", time.perf_counter() - build_start, kind="kpis", sector=sector or "ALL")
+        self._view_cache_put(cache_key, kpi_list)
+        return [copy.copy(kpi) for kpi in kpi_list]
 
     def load_historic_data(self, sector: str, force_refresh=False) -> List[Dict[str, Any]]:
         self._refresh_cache_if_needed(force=force_refresh)
-        df_view = self.df_cache
-        if sector and 'Title' in self.df_cache.columns:
-            df_view = self.df_cache[
-                self.df_cache['Title'].fillna('').astype(str).str.strip().str.lower() == sector.strip().lower()]
 
-        historic_list = []
+        cache_key = self._view_cache_key("historic", sector)
+        cached = self._view_cache_get(cache_key)
+        if cached is not None:
+            return list(cached)
 
-        def fmt_num(val):
-            if pd.isna(val) or str(val).strip() == "": return "-"
-            try:
-                clean_val = str(val).replace("%", "").replace(",", "").strip()
-                f = float(clean_val)
-                return str(int(f)) if f.is_integer() else f"{f:.2f}"
-            except:
-                return str(val)
-
-        for index, row in df_view.iterrows():
-            monthly_data = {}
-            ytd_sum = 0.0
-            has_ytd = False
-            for m_idx in range(1, 13):
-                info = self.months_map[m_idx]
-                raw_act = row.get(f"Achieved {info['suffix']}")
-                try:
-                    if pd.notna(raw_act) and str(raw_act).strip() != "":
-                        val_float = float(str(raw_act).replace("%", "").replace(",", "").strip())
-                        ytd_sum += val_float
-                        has_ytd = True
-                except:
-                    pass
-                monthly_data[m_idx] = {"name": info['suffix'], "target": fmt_num(row.get(info['target'])),
-                                       "actual": fmt_num(raw_act)}
+        build_start = time.perf_counter()
+        state = self._state
+        hist = state.historic
+        positions = self._get_view_positions(state, sector)
+        actual = hist["actual"].display[positions].tolist()
+        target = hist["target"].display[positions].tolist()
+        status = state.cube.status[positions].tolist()
+        suffixes = [self.months_map[m_idx]['suffix'] for m_idx in range(1, 13)]
 
+        historic_list = []
+        for pos, row_actual, row_target, row_status in zip(positions.tolist(), actual, target, status):
             historic_list.append({
-                "id": str(row.get('序号 No.', index)),
-                "name": str(row.get('指标名称 Indicator name', 'Unnamed KPI')),
-                "type": self._parse_kpi_type(str(row.get('Type') or 'GREATER THAN')),
-                "unit": str(row.get('单位 Units') or "-"),
-                "res_2024": fmt_num(row.get('2024 年度成果  Annual Results 2024')),
-                "target_2025": fmt_num(row.get('2025年目标 Basic Target in 2025')),
-                "challenge_2025": fmt_num(row.get('2025年目标 ChallengeTarget in 2025')),
-                "ytd": fmt_num(ytd_sum) if has_ytd else "-",
-                "months": monthly_data
+                "id": hist["id"][pos],
+                "name": hist["name"][pos],
+                "type": hist["type"][pos],
+                "unit": hist["unit"][pos],
+                "res_2024": hist["res_2024"][pos],
+                "target_2025": hist["target_2025"][pos],
+                "challenge_2025": hist["challenge_2025"][pos],
+                "ytd": hist["ytd"][pos],
+                "months": {
+                    m_idx: {"name": suffix, "target": tgt, "actual": act, "status": st}
+                    for m_idx, suffix, tgt, act, st in zip(range(1, 13), suffixes, row_target, row_actual, row_status)
+                }
             })
-        return historic_list
+
+        metrics.observe("view_build", time.perf_counter() - build_start, kind="historic", sector=sector or "ALL")
+        self._view_cache_put(cache_key, historic_list)
+        return list(historic_list)
+
+    def get_dashboard_metrics(self, month_idx: int, sectors: List[str], top_n: int = 3) -> Optional[Dict[str, Any]]:
+        """
+        Resumo executivo de um mês para os setores dados, lido do cubo de status montado no
+        refresh: total, na meta, precisa de ação e ranking de score (atual/meta, meta/atual
+        para LOWER THAN). Só soma contagens e junta os rankings já ordenados de cada setor.
+        """
+        self._refresh_cache_if_needed()
+        state = self._state
+        sector_keys = list(dict.fromkeys(self._normalize_sector(s) for s in sectors if s))
+        if state is None or not any(len(self._get_sector_positions(state, key)) for key in sector_keys):
+            return None
+
+        build_start = time.perf_counter()
+        cube, month = state.cube, month_idx - 1
+        names = state.historic["name"]
+
+        def entries(rows: np.ndarray) -> List[Dict[str, Any]]:
+            return [{"name": names[row], "score": float(cube.score[row, month]),
+                     "status": "Red" if cube.status[row, month] == RED else "Green"}
+                    for row in rows.tolist()]
+
+        top_kpis = entries(cube.ranking(month, sector_keys, head=top_n))
+        if cube.ranked_count(month, sector_keys) > top_n and cube.best_score(month, sector_keys) < 1.0:
+            # Ninguém bateu a meta: a lista de baixo mostra todos os KPIs ranqueados
+            bottom_kpis = entries(cube.ranking(month, sector_keys))
+        else:
+            bottom_kpis = entries(cube.ranking(month, sector_keys, tail=top_n))
+
+        total_kpis, on_target = (int(n) for n in cube.totals(sector_keys)[month])
+        metrics.observe("view_build", time.perf_counter() - build_start, kind="dashboard",
+                        sector=sector_keys[0] if len(sector_keys) == 1 else "ALL")
+        return {
+            "total_kpis": total_kpis,
+            "on_target": on_target,
+            "needs_action": total_kpis - on_target,
+            "perc_on_target": f"{on_target / total_kpis * 100:.1f}%" if total_kpis > 0 else "0.0%",
+            "top_kpis": top_kpis,
+            "bottom_kpis": bottom_kpis,
+            "month_idx": month_idx,
+        }
 
     def save_kpi(self, kpi: KPI, sector: str = None):
         """
@@ -367,8 +1083,16 @@ class SharePointBackend:
         4. Tenta subir para SharePoint
         5. Se falhar, mantém na fila para próxima tentativa
         """
+        self.save_kpis([kpi], sector)
+
+    def save_kpis(self, kpis: List[KPI], sector: str = None):
+        """
+        Escrita em lote: mesmos passos do save_kpi, mas uma única publicação
+        copy-on-write e um único upload para todos os KPIs.
+        A linha é localizada pela chave (setor, 序号 No.); sem setor, pelo primeiro 序号 No.
+        """
         # Garante que temos dados carregados antes de tentar salvar
-        if self.df_cache is None: 
+        if self.df_cache is None:
             self._refresh_cache_if_needed()
 
         eval_date, _ = self._calculate_periods()
@@ -376,53 +1100,150 @@ class SharePointBackend:
 
         # 🆕 Passo 0: Adiciona à fila de pendências PRIMEIRO (segurança)
         if sector:
-            self._add_to_pending_queue(kpi, sector)
+            for kpi in kpis:
+                self._add_to_pending_queue(kpi, sector)
 
         try:
-            # Encontra a linha correta
-            mask = self.df_cache['序号 No.'].astype(str) == str(kpi.id)
-            if not mask.any():
-                print(f"❌ [Backend] KPI ID {kpi.id} não encontrado no cache.")
-                print(f"💾 [Backend] Dados salvos na fila de pendências")
-                return
+            with self._write_lock:
+                state = self._state
 
-            row_idx = self.df_cache.index[mask].tolist()[0]
+                # Encontra as linhas corretas (O(1) por KPI)
+                edits = []
+                for kpi in kpis:
+                    row_pos = self._find_row(state, sector, kpi.id)
+                    if row_pos is None:
+                        log.error(f"❌ [Backend] KPI ID {kpi.id} não encontrado no cache.")
+                        log.info(f"💾 [Backend] Dados salvos na fila de pendências")
+                        continue
+                    updates = {f"Achieved {suffix}": kpi.curr_value}
+                    if kpi.justification:
+                        updates[f"Justification - {suffix}"] = kpi.justification
+                        updates[f"Countermeasure - {suffix}"] = kpi.countermeasure
+                        updates[f"Responsible - {suffix}"] = kpi.countermeasure_resp
+                        updates[f"Countermeasure Date - {suffix}"] = kpi.countermeasure_date
+                    edits.append((kpi, row_pos, updates))
+                if not edits:
+                    return
 
-            # Atualiza o DataFrame em memória
-            col_achieved = f"Achieved {suffix}"
-            self.df_cache.at[row_idx, col_achieved] = kpi.curr_value
+                # Monta o novo estado (copy-on-write) sem tocar no frame que os leitores estão usando
+                historic = self._historic_with_cells(state.historic, suffix,
+                                                     [(row_pos, kpi.curr_value) for kpi, row_pos, _ in edits])
+                new_state = replace(
+                    state,
+                    df=self._frame_with_cells(state.df, [(row_pos, updates) for _, row_pos, updates in edits]),
+                    historic=historic,
+                    cube=state.cube.with_cells([row_pos for _, row_pos, _ in edits], eval_date.month - 1,
+                                               historic["actual"], historic["target"], historic["type_code"]),
+                )
+                # Invalida apenas as views memoizadas do setor editado
+                edited_sectors = {self._row_sector_key(state, row_pos) for _, row_pos, _ in edits}
+                self._publish_state(new_state, edited_sectors.pop() if len(edited_sectors) == 1 else None)
 
-            if kpi.justification:
-                self.df_cache.at[row_idx, f"Justification - {suffix}"] = kpi.justification
-                self.df_cache.at[row_idx, f"Countermeasure - {suffix}"] = kpi.countermeasure
-                self.df_cache.at[row_idx, f"Responsible - {suffix}"] = kpi.countermeasure_resp
-                self.df_cache.at[row_idx, f"Countermeasure Date - {suffix}"] = kpi.countermeasure_date
+                # Passo 1: Salva Localmente (Segurança Imediata) - um append no journal, não o arquivo todo
+                for kpi, row_pos, updates in edits:
+                    self._mark_dirty(state.df, row_pos, updates)
+                    self._journal.append({
+                        "ts": datetime.now().isoformat(),
+                        "sector": self._row_sector_key(state, row_pos),
+                        "kpi_id": kpi.id,
+                        "month_suffix": suffix,
+                        "fields": updates,
+                    })
 
-            # Passo 1: Salva Localmente (Segurança Imediata)
-            print("💾 [Backend] Salvando localmente...")
-            self.df_cache.to_excel(self.local_file_name, index=False)
+            if self._journal.last_seq - self._snapshot_seq >= self.journal_compact_every:
+                self._save_snapshot()
 
-            # Passo 2: Tenta subir para o SharePoint
-            upload_success = self._upload_with_retry()
-            
+            # Passo 2: Sobe para o SharePoint (em lote, na thread de upload, se write-behind)
+            saved_ids = ", ".join(str(kpi.id) for kpi, _, _ in edits)
+            if self.write_behind:
+                for kpi, _, _ in edits:
+                    self._schedule_upload(kpi.id, sector, suffix)
+                log.debug(f"🕒 [Backend] KPI {saved_ids} salvo; upload em lote em até {self.upload_coalesce_seconds}s")
+                return
+
+            upload_success = self._upload_batch_now([(kpi.id, sector, suffix) for kpi, _, _ in edits])
             if upload_success and sector:
-                # Upload bem-sucedido → remove da fila
-                self.pending_queue = [
-                    item for item in self.pending_queue 
-                    if not (item["kpi_id"] == kpi.id and item["sector"] == sector and item["month_suffix"] == suffix)
-                ]
-                self._save_pending_queue()
-                print(f"✅ [Backend] KPI {kpi.id} salvo e removido da fila")
+                log.info(f"✅ [Backend] KPI {saved_ids} salvo e removido da fila")
             elif not upload_success:
-                print(f"⚠️ [Backend] Upload falhou, KPI {kpi.id} mantido na fila")
-
-            # Atualiza timestamp apenas se upload teve sucesso
-            if upload_success:
-                self.last_fetch_time = time.time()
+                log.warning(f"⚠️ [Backend] Upload falhou, KPI {saved_ids} mantido na fila")
 
         except Exception as e:
-            print(f"❌ [Backend] Erro geral ao salvar: {e}")
-            print(f"💾 [Backend] Dados mantidos na fila de pendências")
+            log.error(f"❌ [Backend] Erro geral ao salvar: {e}")
+            log.info(f"💾 [Backend] Dados mantidos na fila de pendências")
+
+    def _schedule_upload(self, kpi_id, sector: Optional[str], suffix: str):
+        """Adiciona a edição ao próximo lote e acorda a thread de upload"""
+        with self._upload_cond:
+            if not self._upload_batch:
+                self._upload_batch_started = time.monotonic()
+            self._upload_batch.append((kpi_id, sector, suffix))
+            if self._uploader_thread is None or not self._uploader_thread.is_alive():
+                self._uploader_thread = threading.Thread(target=self._uploader_loop,
+                                                         name="kpi-write-behind", daemon=True)
+                self._uploader_thread.start()
+            self._upload_cond.notify()
+
+    def _take_upload_batch(self) -> List[Tuple[Any, str, str]]:
+        with self._upload_cond:
+            batch, self._upload_batch = self._upload_batch, []
+            return batch
+
+    def _uploader_loop(self):
+        """Espera a janela de agrupamento fechar e sobe todas as edições do lote num único upload"""
+        while True:
+            with self._upload_cond:
+                while not self._upload_batch:
+                    self._upload_cond.wait()
+                remaining = self.upload_coalesce_seconds - (time.monotonic() - self._upload_batch_started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+            batch = self._take_upload_batch()
+            if batch and not self._upload_batch_now(batch):
+                # Itens continuam na fila de pendências; o lote volta para a próxima tentativa
+                log.warning(f"⚠️ [Backend] Lote com {len(batch)} edições não subiu, nova tentativa em {self.upload_retry_seconds}s")
+                with metrics.span("retry_sleep", stage="batch"):
+                    time.sleep(self.upload_retry_seconds)
+                with self._upload_cond:
+                    if not self._upload_batch:
+                        self._upload_batch_started = time.monotonic()
+                    self._upload_batch = batch + self._upload_batch
+
+    def _upload_batch_now(self, batch: List[Tuple[Any, str, str]]) -> bool:
+        """Um upload do workbook para todas as edições do lote; se der certo, tira todas da fila"""
+        with self._upload_mutex:
+            upload_success = self._upload_with_retry()
+        if not upload_success:
+            return False
+
+        # Upload bem-sucedido → remove da fila
+        self.pending_queue.remove((sector, str(kpi_id), suffix) for kpi_id, sector, suffix in batch if sector)
+        metrics.inc("kpi_uploaded_edits_total", len(batch), help="Edições enviadas em uploads bem-sucedidos")
+        if len(batch) > 1:
+            log.info(f"✅ [Backend] {len(batch)} edições enviadas num único upload")
+
+        # Atualiza timestamp apenas se upload teve sucesso
+        self.last_fetch_time = time.time()
+        return True
+
+    def flush_uploads(self) -> bool:
+        """Sobe agora o lote pendente, sem esperar a janela (também roda ao encerrar o processo)"""
+        batch = self._take_upload_batch()
+        if not batch:
+            return True
+        return self._upload_batch_now(batch)
+
+    def _patch_content(self, state: CacheState, base: bytes, dirty: Dict[Tuple[str, str], set]) -> Optional[bytes]:
+        """Workbook original + células sujas; None quando o patch não se aplica (gera o arquivo inteiro)"""
+        if '序号 No.' not in state.df.columns or 'Title' not in state.df.columns:
+            return None
+        edits = self._dirty_edits(state, dirty)
+        content = patch_workbook(base, "Sheet1", ('Title', '序号 No.'), edits) if edits is not None else None
+        if content is None:
+            log.warning("⚠️ [Backend] Patch de células não aplicável, regenerando o workbook inteiro")
+        else:
+            log.info(f"🩹 [Backend] Patch de {sum(len(c) for c in edits.values())} células em {len(edits)} linhas")
+        return content
 
     def _upload_with_retry(self, max_retries=3) -> bool:
         """
@@ -431,41 +1252,87 @@ class SharePointBackend:
         """
         for attempt in range(1, max_retries + 1):
             try:
-                print(f"☁️ [Backend] Tentativa de upload {attempt}/{max_retries}...")
+                log.debug(f"☁️ [Backend] Tentativa de upload {attempt}/{max_retries}...")
                 self._upload_to_sharepoint()
-                print("✅ [Backend] Upload concluído com sucesso!")
+                log.info("✅ [Backend] Upload concluído com sucesso!")
+                metrics.inc("kpi_uploads_total", help="Uploads por resultado", result="ok")
                 return True  # Sucesso
             except Exception as e:
                 error_msg = str(e).lower()
-                is_lock_error = any(keyword in error_msg for keyword in ['lock', 'locked', 'checked out', 'in use'])
+                is_lock_error = isinstance(e, StorageLockedError) or \
+                    any(keyword in error_msg for keyword in ['lock', 'locked', 'checked out', 'in use'])
                 
+                metrics.inc("kpi_upload_failures_total", help="Tentativas de upload que falharam",
+                            reason="lock" if is_lock_error else "error")
                 if is_lock_error:
-                    print(f"🔒 [Backend] Arquivo travado por outro usuário (Admin editando?)")
+                    log.info(f"🔒 [Backend] Arquivo travado por outro usuário (Admin editando?)")
                 else:
-                    print(f"⚠️ [Backend] Falha no upload (Tentativa {attempt}): {e}")
+                    log.warning(f"⚠️ [Backend] Falha no upload (Tentativa {attempt}): {e}")
                 
                 if attempt < max_retries:
                     sleep_time = 2 * attempt  # Backoff: espera 2s, depois 4s...
-                    print(f"⏳ [Backend] Aguardando {sleep_time} segundos para tentar novamente...")
-                    time.sleep(sleep_time)
+                    log.info(f"⏳ [Backend] Aguardando {sleep_time} segundos para tentar novamente...")
+                    with metrics.span("retry_sleep", stage="upload"):
+                        time.sleep(sleep_time)
                 else:
-                    print("❌ [Backend] Upload falhou após todas as tentativas.")
-                    print("💾 [Backend] Arquivo LOCAL atualizado + dados na fila de pendências")
+                    metrics.inc("kpi_uploads_total", result="failed")
+                    log.error("❌ [Backend] Upload falhou após todas as tentativas.")
+                    log.info("💾 [Backend] Snapshot LOCAL atualizado + dados na fila de pendências")
                     return False  # Falha
 
     def _upload_to_sharepoint(self):
         # Esta função lança exceção se falhar, permitindo que o retry capture
-        ctx = self._get_context()
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            self.df_cache.to_excel(writer, index=False)
-        output.seek(0)
+        # Estado e células sujas lidos juntos sob _write_lock: save_kpis publica e marca sob o
+        # mesmo lock, então um save concorrente não deixa uma célula suja com o valor antigo
+        with self._write_lock:
+            state = self._state
+            journal_seq = self._journal.last_seq  # edições contidas neste upload
+            with self._dirty_lock:
+                dirty, self._dirty_cells = self._dirty_cells, {}
+        if not dirty and self.patch_upload and self._uploaded_seq >= journal_seq:
+            # Nada sujo: as edições do lote já subiram num upload anterior
+            return
+
+        try:
+            base = self._remote_bytes if self._remote_bytes is not None else self.storage.download()
+            content = None
+            if self.patch_upload and dirty:
+                with metrics.span("serialize", target="patch"):
+                    content = self._patch_content(state, base, dirty)
+            if content is None:
+                # O cache só tem as colunas projetadas: remonta o workbook inteiro para não apagar as demais
+                with metrics.span("serialize", target="workbook"):
+                    output = io.BytesIO()
+                    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+                        self._full_workbook(state.df, base).to_excel(writer, index=False)
+                    content = output.getvalue()
+
+            # Sobrescreve o arquivo no SharePoint
+            with metrics.span("upload"):
+                metadata = self.storage.upload(content)
+        except Exception:
+            # Nada subiu: as células continuam sujas para a próxima tentativa
+            with self._dirty_lock:
+                for key, columns in dirty.items():
+                    self._dirty_cells.setdefault(key, set()).update(columns)
+            raise
 
-        # Sobrescreve o arquivo no SharePoint
-        ctx.web.get_folder_by_server_relative_url("Shared Documents/5.Information Registry") \
-            .upload_file("KPISystem.xlsx", output.read()) \
-            .execute_query()
+        # O arquivo remoto agora é exatamente o que está em memória:
+        # o próximo refresh reconhece o próprio upload e não reparseia
+        content_hash = hashlib.sha256(content).hexdigest()
+        with self._write_lock:
+            self._remote_metadata = metadata
+            self._remote_content_hash = content_hash
+            self._remote_bytes = content
+            self._upload_generation += 1
+            self._uploaded_seq = max(self._uploaded_seq, journal_seq)
 
 
 
-backend = SharePointBackend()
+# KPI_STORAGE_DIR: pasta local ou compartilhamento de rede com o KPISystem.xlsx, no lugar do SharePoint
+# KPI_CACHE_DIR: pasta do snapshot/journal/fila no lugar de .cache/ (ex.: benchmarks)
+_storage_dir = os.environ.get("KPI_STORAGE_DIR")
+backend = SharePointBackend(storage=LocalDirectoryDriver(_storage_dir) if _storage_dir else None,
+                            cache_dir=os.environ.get("KPI_CACHE_DIR") or None)
+# KPI_METRICS_PORT / KPI_METRICS_FILE: métricas no formato Prometheus (ver utils/metrics.py)
+metrics.start_exporters_from_env()
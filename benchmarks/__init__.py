@@ -0,0 +1 @@
+# Benchmarks do backend (python -m benchmarks.run)
@@ -0,0 +1,209 @@
+"""
+Benchmarks dos caminhos quentes do backend contra o driver local (sem SharePoint).
+
+    python -m benchmarks.run --sectors 8 --kpis 25 --output bench.json
+    python -m benchmarks.run --compare bench.json   # compara com uma execução anterior
+
+O JSON de saída guarda o commit, as versões e min/mediana/média/máx de cada caso.
+Com --compare, casos com o melhor tempo acima de --threshold (25%) saem com código 1.
+"""
+import io
+import os
+import sys
+import json
+import logging
+import time
+import random
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+from utils.storage import LocalDirectoryDriver, SimulatedDriver
+from utils.snapshot import save_snapshot, load_snapshot
+from utils.workbook import EXCEL_ENGINE
+from benchmarks.workbook import generate_workbook
+
+
+def measure(fn: Callable[..., Any], setup: Optional[Callable[[], tuple]] = None, repeat: int = 5) -> Dict[str, Any]:
+    """Roda fn repeat vezes; setup (não cronometrado) devolve os argumentos de cada execução"""
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        fn(*args)
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "runs": repeat,
+        "min_ms": round(min(times), 3),
+        "median_ms": round(statistics.median(times), 3),
+        "mean_ms": round(statistics.fmean(times), 3),
+        "max_ms": round(max(times), 3),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _clear_views(be):
+    # Mede a montagem das views, não o LRU
+    with be._view_cache_lock:
+        be._view_cache.clear()
+
+
+def run_benchmarks(workdir: Path, args) -> Dict[str, Dict[str, Any]]:
+    content = generate_workbook(sectors=args.sectors, kpis_per_sector=args.kpis, seed=args.seed)
+    storage_dir = workdir / "storage"
+    storage_dir.mkdir()
+    (storage_dir / "KPISystem.xlsx").write_bytes(content)
+    # Importar o backend cria o backend do módulo: aponta ele para a pasta temporária
+    # (sem SharePoint, sem arquivos no .cache/ do repositório)
+    os.environ["KPI_STORAGE_DIR"] = str(storage_dir)
+    os.environ["KPI_CACHE_DIR"] = str(workdir / "module_cache")
+    from backend import SharePointBackend
+    storage = LocalDirectoryDriver(storage_dir)
+    if args.latency or args.lock_error_rate:
+        storage = SimulatedDriver(storage, latency=args.latency, lock_error_rate=args.lock_error_rate, seed=args.seed)
+
+    be = SharePointBackend(storage=storage, cache_dir=workdir / "cache")
+    if args.sync_upload:
+        be.write_behind = False
+    be.upload_coalesce_seconds = 3600  # o lote só sobe no flush cronometrado
+
+    rng = random.Random(args.seed)
+    results: Dict[str, Dict[str, Any]] = {}
+    repeat = args.repeat
+
+    results["ingest"] = measure(lambda: be._read_workbook(io.BytesIO(content), "Sheet1"), repeat=repeat)
+
+    def full_refresh_setup():
+        # Esquece a versão conhecida: refresh completo (metadados + download + parse + merge + snapshot)
+        be._remote_metadata = None
+        be._remote_content_hash = None
+        return ()
+    results["refresh"] = measure(be._fetch_and_publish, full_refresh_setup, repeat)
+
+    sectors = be.get_available_sectors()
+    sector = sectors[0]
+
+    def cold_views():
+        _clear_views(be)
+        return ()
+    results["load_data"] = measure(lambda: be.load_data(sector), cold_views, repeat)
+    results["load_data_cached"] = measure(lambda: be.load_data(sector), repeat=repeat)
+    results["load_historic_data"] = measure(lambda: be.load_historic_data(sector), cold_views, repeat)
+    month_idx = be._calculate_periods()[0].month
+    results["dashboard_metrics_all"] = measure(lambda: be.get_dashboard_metrics(month_idx, sectors), cold_views, repeat)
+
+    kpis = be.load_data(sector)
+
+    def edit_setup():
+        kpi = rng.choice(kpis)
+        kpi.curr_value = str(rng.randint(1, 999))
+        return kpi, sector
+    results["save_kpi"] = measure(be.save_kpi, edit_setup, repeat)
+
+    def batch_setup():
+        for _ in range(args.batch):
+            be.save_kpi(*edit_setup())
+        return ()
+    results["flush_uploads"] = measure(be.flush_uploads, batch_setup, repeat)
+
+    def queue_setup():
+        state = be._state
+        suffix = be.months_map[month_idx]["suffix"]
+        for _ in range(args.pending):
+            s = rng.choice(sectors)
+            be.pending_queue.upsert({
+                "sector": s, "kpi_id": str(rng.randint(1, args.kpis)), "kpi_name": "bench",
+                "timestamp": "", "month_suffix": suffix,
+                "data": {"curr_value": str(rng.randint(1, 999)), "justification": "", "countermeasure": "",
+                         "countermeasure_date": "", "countermeasure_resp": ""},
+            })
+        return state.df.copy(), state.row_index
+    results["process_pending_queue"] = measure(be._process_pending_queue, queue_setup, repeat)
+
+    snapshot_dir = workdir / "snapshot"
+    snapshot_dir.mkdir()
+    df = be._state.df
+    results["snapshot_save"] = measure(lambda: save_snapshot(snapshot_dir, df, {}), repeat=repeat)
+    results["snapshot_load"] = measure(lambda: load_snapshot(snapshot_dir), repeat=repeat)
+    return results
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float, floor_ms: float = 0.5) -> bool:
+    """
+    Imprime o melhor tempo antigo x novo; retorna True se algum caso regrediu além do
+    threshold. Compara o mínimo (menos ruído que a média) e ignora diferenças abaixo de floor_ms.
+    """
+    regressed = False
+    print(f"{'caso':<24}{'antes (ms)':>12}{'agora (ms)':>12}{'razão':>8}")
+    for name, result in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            print(f"{name:<24}{'-':>12}{result['min_ms']:>12.2f}{'novo':>8}")
+            continue
+        ratio = result["min_ms"] / old["min_ms"] if old["min_ms"] else float("inf")
+        worse = ratio > 1 + threshold and result["min_ms"] - old["min_ms"] > floor_ms
+        regressed |= worse
+        print(f"{name:<24}{old['min_ms']:>12.2f}{result['min_ms']:>12.2f}{ratio:>8.2f}{' ⚠️' if worse else ''}")
+    return regressed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks do backend de KPIs")
+    parser.add_argument("--sectors", type=int, default=8)
+    parser.add_argument("--kpis", type=int, default=25, help="KPIs por setor")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=10, help="edições por upload em flush_uploads")
+    parser.add_argument("--pending", type=int, default=200, help="itens na fila em process_pending_queue")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="latência simulada por chamada (s)")
+    parser.add_argument("--lock-error-rate", type=float, default=0.0)
+    parser.add_argument("--sync-upload", action="store_true", help="desliga o write-behind")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="JSON de uma execução anterior")
+    parser.add_argument("--threshold", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    # Só erros no console: o log por operação distorceria os tempos
+    logging.getLogger("kpi").setLevel(logging.ERROR)
+    with tempfile.TemporaryDirectory(prefix="kpi-bench-", ignore_cleanup_errors=True) as tmp:
+        results = run_benchmarks(Path(tmp), args)
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "excel_engine": EXCEL_ENGINE or "openpyxl",
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "threshold")},
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressed = compare(baseline, report, args.threshold)
+        print(f"📄 Resultados em {args.output}")
+        return 1 if regressed else 0
+
+    for name, result in results.items():
+        print(f"{name:<24}{result['median_ms']:>10.2f} ms  (min {result['min_ms']:.2f})")
+    print(f"📄 Resultados em {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import io
+import random
+from datetime import date
+from typing import Optional
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+from utils.constants import SECTORS
+
+MONTHS = [("1月 Jan.", "Jan"), ("2月 Feb.", "Feb"), ("3月 Mar.", "Mar"), ("4月 Apr.", "Apr"),
+          ("5月 May", "May"), ("6月 Jun.", "Jun"), ("7月 Jul.", "Jul"), ("8月 Aug.", "Aug"),
+          ("9月 Sep.", "Sep"), ("10月 Oct.", "Oct"), ("11月 Nov.", "Nov"), ("12月 Dec.", "Dec")]
+
+UNITS = ["%", "%", "pcs", "days", "R$", "units"]
+TEXT_TARGETS = ["OK", "Done", "Yes"]
+PEOPLE = ["Ana", "Bruno", "Carla", "Diego", "Elisa"]
+
+
+def _target(kind: str, unit: str, rng: random.Random):
+    """Metas como aparecem na planilha real: números, "95%", "1,200" ou texto"""
+    if kind == "TEXT":
+        return rng.choice(TEXT_TARGETS)
+    if unit == "%":
+        value = rng.randint(50, 100)
+        return f"{value}%" if rng.random() < 0.5 else value / 100
+    value = rng.randint(10, 5000)
+    return f"{value:,}" if value >= 1000 and rng.random() < 0.5 else value
+
+
+def _achieved(kind: str, target, rng: random.Random):
+    if kind == "TEXT":
+        return target if rng.random() < 0.8 else "Pending"
+    text = str(target).replace("%", "").replace(",", "")
+    base = float(text) if text else 1.0
+    value = round(base * rng.uniform(0.7, 1.3), 2)
+    return f"{value:g}%" if str(target).endswith("%") else value
+
+
+def generate_kpi_frame(sectors: int = 8, kpis_per_sector: int = 25, filled_months: Optional[int] = None,
+                       fill_rate: float = 0.9, current_fill_rate: float = 0.5, seed: int = 0) -> pd.DataFrame:
+    """
+    Monta um KPISystem sintético com os cabeçalhos bilíngues da planilha real.
+    Meses anteriores a filled_months vêm quase completos (fill_rate), o próprio mês
+    filled_months pela metade (current_fill_rate) e os seguintes vazios.
+    Por padrão filled_months é o mês avaliado pelo backend (mês anterior a hoje).
+    """
+    rng = random.Random(seed)
+    if filled_months is None:
+        filled_months = (date.today() - relativedelta(months=1)).month
+    names = [SECTORS[i] if i < len(SECTORS) else f"{SECTORS[i % len(SECTORS)]} {i // len(SECTORS) + 1}"
+             for i in range(sectors)]
+
+    rows = []
+    for sector in names:
+        for number in range(1, kpis_per_sector + 1):
+            kind = rng.choices(["GREATER THAN", "LOWER THAN", "TEXT"], weights=[6, 3, 1])[0]
+            unit = "-" if kind == "TEXT" else rng.choice(UNITS)
+            row = {
+                "Title": sector,
+                "序号 No.": number,
+                "指标名称 Indicator name": f"{sector} KPI {number}",
+                "口径 KPI description": f"Indicador {number} de {sector}" if rng.random() < 0.7 else None,
+                "Type": kind,
+                "单位 Units": unit,
+                "2024 年度成果  Annual Results 2024": _achieved(kind, _target(kind, unit, rng), rng),
+                "2025年目标 Basic Target in 2025": _target(kind, unit, rng),
+                "2025年目标 ChallengeTarget in 2025": _target(kind, unit, rng),
+            }
+            for month, (target_col, suffix) in enumerate(MONTHS, start=1):
+                target = _target(kind, unit, rng)
+                row[target_col] = target
+                rate = fill_rate if month < filled_months else current_fill_rate if month == filled_months else 0
+                filled = rng.random() < rate
+                row[f"Achieved {suffix}"] = _achieved(kind, target, rng) if filled else None
+                explained = filled and rng.random() < 0.3
+                row[f"Justification - {suffix}"] = "Volume abaixo do previsto" if explained else None
+                row[f"Countermeasure - {suffix}"] = "Plano de ação com o time" if explained else None
+                row[f"Responsible - {suffix}"] = rng.choice(PEOPLE) if explained else None
+                row[f"Countermeasure Date - {suffix}"] = f"2025-{month:02d}-28" if explained else None
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def generate_workbook(**kwargs) -> bytes:
+    """Mesmos parâmetros de generate_kpi_frame; retorna o .xlsx (Sheet1) em bytes"""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        generate_kpi_frame(**kwargs).to_excel(writer, sheet_name="Sheet1", index=False)
+    return output.getvalue()
@@ -1,5 +1,7 @@
 import rio
+from typing import Optional
 from utils.models import KPIType
+from utils.kpi_eval import GREEN, RED, evaluate
 from utils.styles import *
 
 class HistoricMonthCell(rio.Component):
@@ -7,25 +9,11 @@ class HistoricMonthCell(rio.Component):
     actual: str
     kpi_type: KPIType
     month_name: str
-
-    def _clean_float(self, val: str) -> float:
-        try:
-            clean = str(val).replace("%", "").strip().replace(",", "").replace("_", "")
-            if not clean: return 0.0
-            return float(clean)
-        except: return 0.0
+    status: Optional[int] = None  # status do backend (load_historic_data); sem ele, avalia aqui
 
     def _get_bg_color(self) -> rio.Color:
-        if str(self.actual) == "-" or str(self.target) == "-": return BG_NEUTRAL
-        try:
-            val_f = self._clean_float(self.actual)
-            tgt_f = self._clean_float(self.target)
-            type_str = str(self.kpi_type.value if isinstance(self.kpi_type, KPIType) else self.kpi_type).upper()
-            if "TEXT" in type_str: is_bad = str(self.actual).lower() != str(self.target).lower()
-            elif "LOWER" in type_str: is_bad = val_f > tgt_f
-            else: is_bad = val_f < tgt_f
-            return BG_RED_LIGHT if is_bad else BG_GREEN_LIGHT
-        except: return BG_NEUTRAL
+        status = self.status if self.status is not None else evaluate(self.actual, self.target, self.kpi_type)
+        return {GREEN: BG_GREEN_LIGHT, RED: BG_RED_LIGHT}.get(status, BG_NEUTRAL)
 
     def build(self) -> rio.Component:
         bg = self._get_bg_color()
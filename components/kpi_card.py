@@ -1,14 +1,19 @@
 from typing import Callable
 from datetime import datetime, date
 import rio
-from utils.models import KPI, KPIType
+from utils.models import KPI
+from utils.kpi_eval import GREEN, RED, evaluate
 from utils.styles import *
+from utils.metrics import get_logger
+
+log = get_logger("kpi_card")
 
 class KPICard(rio.Component):
     kpi: KPI
     on_submit: Callable[[KPI], None]
 
     current_value: str = ""
+    current_status: int = 0  # reavaliado só quando o valor digitado muda
     is_justifying: bool = False
     is_locked: bool = False
     temp_justification: str = ""
@@ -17,9 +22,10 @@ class KPICard(rio.Component):
     temp_resp: str = ""
 
     def __post_init__(self):
-        print(f"🎴 [KPICard] Inicializando card: {self.kpi.name}")
+        log.debug(f"🎴 [KPICard] Inicializando card: {self.kpi.name}")
         try:
             self.current_value = self.kpi.curr_value
+            self.current_status = self.kpi.curr_status
             self.temp_justification = self.kpi.justification
             self.temp_countermeasure = self.kpi.countermeasure
             self.temp_resp = self.kpi.countermeasure_resp
@@ -30,46 +36,26 @@ class KPICard(rio.Component):
 
             if self.kpi.curr_value and str(self.kpi.curr_value).strip() != "":
                 self.is_locked = True
-            print(f"✅ [KPICard] Card inicializado: {self.kpi.name}")
+            log.debug(f"✅ [KPICard] Card inicializado: {self.kpi.name}")
         except Exception as e:
-            print(f"❌ [KPICard] Erro ao inicializar: {e}")
-            import traceback
-            traceback.print_exc()
+            log.exception(f"❌ [KPICard] Erro ao inicializar: {e}")
 
-    def _clean_float(self, val: str) -> float:
-        try:
-            clean = str(val).replace("%", "").strip().replace(",", "").replace("_", "")
-            if not clean: return 0.0
-            return float(clean)
-        except: return 0.0
-
-    def _is_performance_bad(self, value: str, target: str) -> bool:
-        if not value or not str(value).strip(): return False
-        try:
-            type_str = str(self.kpi.type.value if isinstance(self.kpi.type, KPIType) else self.kpi.type).upper()
-            if "TEXT" in type_str:
-                return str(value).strip().lower() != str(target).strip().lower()
-            val_f = self._clean_float(value)
-            tgt_f = self._clean_float(target)
-            if "LOWER" in type_str: return val_f > tgt_f
-            else: return val_f < tgt_f
-        except: return True
+    def _status_color(self, status: int) -> rio.Color:
+        return {GREEN: COLOR_GREEN, RED: COLOR_RED}.get(status, COLOR_GREY_TXT)
 
     def _calculate_state(self) -> tuple[str, rio.Color, bool]:
         if self.is_locked: return ("SAVED", COLOR_LOCKED, False)
         if not self.current_value.strip(): return ("SEND", COLOR_DISABLED, False)
-        is_bad = self._is_performance_bad(self.current_value, self.kpi.curr_target)
-        return ("JUSTIFY", COLOR_RED, True) if is_bad else ("SEND", COLOR_GREEN, True)
+        return ("JUSTIFY", COLOR_RED, True) if self.current_status == RED else ("SEND", COLOR_GREEN, True)
 
     def _get_value_color(self) -> rio.Color:
-        if not self.current_value: return COLOR_GREY_TXT
-        is_bad = self._is_performance_bad(self.current_value, self.kpi.curr_target)
-        return COLOR_RED if is_bad else COLOR_GREEN
+        return self._status_color(self.current_status)
 
     def _on_change(self, event):
         if not self.is_locked:
             self.current_value = event.text
             self.kpi.curr_value = event.text
+            self.current_status = evaluate(event.text, self.kpi.curr_target, self.kpi.type)
 
     def _on_main_button_click(self):
         if self.is_locked: return
@@ -125,10 +111,7 @@ class KPICard(rio.Component):
 
     def _build_metrics_view(self):
         lbl, btn_color, enabled = self._calculate_state()
-        try:
-            prev_bad = self._is_performance_bad(self.kpi.prev_achieved, self.kpi.prev_target)
-            prev_color = COLOR_RED if prev_bad else COLOR_GREEN
-        except: prev_color = COLOR_GREY_TXT
+        prev_color = self._status_color(self.kpi.prev_status)
         return rio.Row(
             self._build_spec_block("Prev Target", self.kpi.prev_target),
             self._build_spec_block("Prev Achieved", self.kpi.prev_achieved, custom_color=prev_color, is_bold=True),
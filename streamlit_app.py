@@ -4,9 +4,12 @@ import datetime
 import time
 import base64
 from backend import backend
+from utils.metrics import get_logger
 from utils.models import KPI
 from streamlit_pages import insert_results_page, historic_page, dashboard_page
 
+log = get_logger("app")
+
 # Configuração da página
 st.set_page_config(
     page_title="PMO Analytics",
@@ -295,7 +298,7 @@ time_since_last_refresh = current_time - st.session_state.last_refresh_timestamp
 
 if time_since_last_refresh > AUTO_REFRESH_INTERVAL:
     # Passou 15 minutos, faz refresh automático silencioso
-    print(f"⏰ [Auto-Refresh] {int(time_since_last_refresh/60)} minutos desde último refresh. Atualizando...")
+    log.info(f"⏰ [Auto-Refresh] {int(time_since_last_refresh/60)} minutos desde último refresh. Atualizando...")
     try:
         backend._refresh_cache_if_needed(force=False)  # Refresh normal (não forçado)
         st.session_state.pending_count = backend.get_pending_count()
@@ -306,7 +309,7 @@ if time_since_last_refresh > AUTO_REFRESH_INTERVAL:
         raw_sectors = backend.get_available_sectors()
         st.session_state.available_sectors = [''] + raw_sectors
     except Exception as e:
-        print(f"❌ [Auto-Refresh] Erro: {e}")
+        log.error(f"❌ [Auto-Refresh] Erro: {e}")
 
 # Função para trocar de página
 def navigate_to(page_name):
@@ -378,6 +381,10 @@ with st.sidebar:
     
     # Status com card (MÍNIMO possível)
     st.markdown("### ⚙️ STATUS")
+
+    # Horário real dos dados servidos (em stale-while-revalidate pode ser anterior ao último refresh)
+    data_timestamp = backend.get_data_timestamp()
+    last_label = datetime.datetime.fromtimestamp(data_timestamp).strftime("%H:%M") if data_timestamp else st.session_state.last_refresh
     
     st.markdown(f"""
     <div style="
@@ -388,7 +395,7 @@ with st.sidebar:
         margin: 0.1rem 0;
     ">
         <div style="color: #374151; font-size: 0.7rem; margin-bottom: 0.2rem; line-height: 1.2;">
-            ⏰ <strong>Last:</strong> {st.session_state.last_refresh}
+            ⏰ <strong>Last:</strong> {last_label}
         </div>
         <div style="color: {'#F59E0B' if st.session_state.pending_count > 0 else '#10B981'}; font-size: 0.7rem; line-height: 1.2;">
             {'⚠️' if st.session_state.pending_count > 0 else '✅'} <strong>Pending:</strong> {st.session_state.pending_count}
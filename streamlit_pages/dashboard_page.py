@@ -5,81 +5,10 @@ from dateutil.relativedelta import relativedelta
 from utils.constants import MONTH_NAMES, MONTH_OPTIONS
 from typing import Optional, Dict, Any, List
 
-def _is_kpi_bad(actual, target, kpi_type) -> bool:
-    """Verifica se o KPI está ruim"""
-    try:
-        def clean_float(val):
-            clean = str(val).replace("%", "").strip().replace(",", "").replace("_", "")
-            return float(clean) if clean else 0.0
-
-        if kpi_type.value == 'TEXT':
-            return str(actual).lower() != str(target).lower()
-        val_f = clean_float(actual)
-        tgt_f = clean_float(target)
-        if kpi_type.value == 'LOWER_THAN':
-            return val_f > tgt_f
-        else:
-            return val_f < tgt_f
-    except:
-        return True
-
 def _calculate_dashboard_metrics(month_idx: int, sector_filter: str, available_sectors: List[str]) -> Optional[Dict[str, Any]]:
-    """Calcula métricas do dashboard"""
-    all_kpis_data = []
+    """Calcula métricas do dashboard (uma passada vetorizada no backend para todos os setores)"""
     sectors_to_load = [s for s in available_sectors if s != "ALL DEPARTMENTS"] if sector_filter == "ALL DEPARTMENTS" else [sector_filter]
-
-    for sector in sectors_to_load:
-        historic_data = backend.load_historic_data(sector)
-        all_kpis_data.extend(historic_data)
-
-    if not all_kpis_data:
-        return None
-
-    total_kpis = 0
-    kpis_on_target = 0
-    kpi_scores = []
-
-    for item in all_kpis_data:
-        month_data = item['months'].get(month_idx)
-        if not month_data or str(month_data['actual']) == "-" or str(month_data['target']) == "-":
-            continue 
-
-        total_kpis += 1
-        is_bad = _is_kpi_bad(month_data['actual'], month_data['target'], item['type'])
-        if not is_bad:
-            kpis_on_target += 1
-
-        score = 0.0
-        try:
-            val_f = float(str(month_data['actual']).replace('%', '').replace(',',''))
-            tgt_f = float(str(month_data['target']).replace('%', '').replace(',',''))
-            if tgt_f != 0:
-                if item['type'].value == 'LOWER_THAN':
-                    score = (tgt_f / val_f) if val_f > 0 else 0 
-                else:
-                    score = val_f / tgt_f
-            else:
-                score = 1.0 if not is_bad else 0.0
-        except:
-            score = 0.0
-
-        kpi_scores.append({"name": item['name'], "score": score, "status": "Red" if is_bad else "Green"})
-
-    ranked_scores = sorted([s for s in kpi_scores if s['score'] != 0.0], key=lambda x: x['score'], reverse=True)
-    top_kpis = ranked_scores[:3]
-    bottom_kpis = ranked_scores[-3:]
-    if len(ranked_scores) > 3 and ranked_scores[0]['score'] < 1.0:
-        bottom_kpis = ranked_scores
-
-    return {
-        "total_kpis": total_kpis,
-        "on_target": kpis_on_target,
-        "needs_action": total_kpis - kpis_on_target,
-        "perc_on_target": f"{kpis_on_target / total_kpis * 100:.1f}%" if total_kpis > 0 else "0.0%",
-        "top_kpis": top_kpis,
-        "bottom_kpis": bottom_kpis,
-        "month_idx": month_idx
-    }
+    return backend.get_dashboard_metrics(month_idx, sectors_to_load)
 
 def render_summary_card(title: str, value: str, sub_title: str, icon: str, color: str):
     """Renderiza um card de sumário"""
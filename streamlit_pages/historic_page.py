@@ -1,45 +1,20 @@
+import html
 import streamlit as st
 from backend import backend
-from utils.models import KPIType
+from utils.kpi_eval import NEUTRAL, GREEN, RED
+from typing import Any, Dict, List, Tuple
 import pandas as pd
 
-def _clean_float(val: str) -> float:
-    """Converte string para float"""
-    try:
-        clean = str(val).replace("%", "").strip().replace(",", "").replace("_", "")
-        if not clean:
-            return 0.0
-        return float(clean)
-    except:
-        return 0.0
+# Background e cor do texto por status (avaliado no backend: nenhum parse na renderização)
+_CELL_COLORS = {
+    NEUTRAL: ("#F3F4F6", "#6B7280"),
+    GREEN: ("#D1FAE5", "#065F46"),
+    RED: ("#FEE2E2", "#991B1B"),
+}
 
-def _get_cell_color(actual: str, target: str, kpi_type: KPIType) -> tuple:
-    """Retorna background e cor do texto baseado na performance"""
-    if str(actual) == "-" or str(target) == "-":
-        return "#F3F4F6", "#6B7280"  # Neutral
-    
-    try:
-        val_f = _clean_float(actual)
-        tgt_f = _clean_float(target)
-        type_str = str(kpi_type.value if isinstance(kpi_type, KPIType) else kpi_type).upper()
-        
-        if "TEXT" in type_str:
-            is_bad = str(actual).lower() != str(target).lower()
-        elif "LOWER" in type_str:
-            is_bad = val_f > tgt_f
-        else:
-            is_bad = val_f < tgt_f
-        
-        if is_bad:
-            return "#FEE2E2", "#991B1B"  # Red
-        else:
-            return "#D1FAE5", "#065F46"  # Green
-    except:
-        return "#F3F4F6", "#6B7280"  # Neutral
-
-def render_month_cell(month_data: dict, kpi_type: KPIType):
+def render_month_cell(month_data: dict):
     """Renderiza uma célula de mês"""
-    bg_color, txt_color = _get_cell_color(month_data['actual'], month_data['target'], kpi_type)
+    bg_color, txt_color = _CELL_COLORS[month_data['status']]
     
     st.markdown(f"""
     <div style="
@@ -62,6 +37,125 @@ def render_month_cell(month_data: dict, kpi_type: KPIType):
     </div>
     """, unsafe_allow_html=True)
 
+def _render_cards(data: List[Dict[str, Any]]):
+    """Um card por KPI com os 12 meses em colunas (muitos elementos: para setores pequenos)"""
+    for item in data:
+        st.markdown('<div style="margin-bottom: 1rem;">', unsafe_allow_html=True)
+        
+        # Container principal com informações + meses
+        col_info, col_months = st.columns([3, 9])
+        
+        with col_info:
+            # Card de informações do KPI
+            st.markdown("""
+            <div style="background-color: #FFFFFF; border-radius: 0.3rem; padding: 1rem; min-height: 150px; border: 1px solid #E5E7EB;">
+            """, unsafe_allow_html=True)
+            
+            st.markdown(f"""
+            <div style="font-size: 1rem; font-weight: bold; color: #1F2937; margin-bottom: 0.5rem;">
+                {item['name']}
+            </div>
+            <div style="font-size: 0.75rem; color: #9CA3AF; margin-bottom: 1rem;">
+                Unit: <span style="font-weight: bold; color: #6B7280;">{item.get('unit', '-')}</span>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # Métricas em grid
+            st.markdown('<div style="display: grid; grid-template-columns: 1fr 1fr; gap: 0.8rem;">', unsafe_allow_html=True)
+            
+            # YTD 2025
+            st.markdown(f"""
+            <div>
+                <div style="font-size: 0.65rem; color: #9CA3AF; font-weight: bold;">YTD 2025</div>
+                <div style="font-size: 1rem; color: #111827; font-weight: bold;">{item.get('ytd', '-')}</div>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # '24 Result
+            st.markdown(f"""
+            <div>
+                <div style="font-size: 0.65rem; color: #9CA3AF; font-weight: bold;">'24 RESULT</div>
+                <div style="font-size: 1rem; color: #6B7280;">{item.get('res_2024', '-')}</div>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # '25 Target
+            st.markdown(f"""
+            <div>
+                <div style="font-size: 0.65rem; color: #9CA3AF; font-weight: bold;">'25 TARGET</div>
+                <div style="font-size: 1rem; color: #6B7280;">{item.get('target_2025', '-')}</div>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            # '25 Challenge
+            st.markdown(f"""
+            <div>
+                <div style="font-size: 0.65rem; color: #9CA3AF; font-weight: bold;">'25 CHALLENGE</div>
+                <div style="font-size: 1rem; color: #EA580C; font-weight: bold;">{item.get('challenge_2025', '-')}</div>
+            </div>
+            """, unsafe_allow_html=True)
+            
+            st.markdown('</div>', unsafe_allow_html=True)  # Fecha grid
+            st.markdown('</div>', unsafe_allow_html=True)  # Fecha card
+        
+        with col_months:
+            # Células dos meses em scroll horizontal
+            st.markdown('<div style="display: flex; overflow-x: auto; gap: 0.3rem; padding: 0.5rem; background-color: #F9FAFB; border-radius: 0.3rem;">', unsafe_allow_html=True)
+            
+            # Cria colunas para os 12 meses
+            month_cols = st.columns(12)
+            for m_idx, col in enumerate(month_cols, start=1):
+                m_data = item['months'][m_idx]
+                with col:
+                    render_month_cell(m_data)
+            
+            st.markdown('</div>', unsafe_allow_html=True)
+        
+        st.markdown('</div>', unsafe_allow_html=True)
+        st.markdown('<hr style="border: none; border-top: 1px solid #E5E7EB; margin: 1.5rem 0;">', unsafe_allow_html=True)
+
+_TABLE_CSS = (
+    "<style>"
+    ".kh-wrap{overflow-x:auto;background-color:#FFFFFF;border:1px solid #E5E7EB;border-radius:0.3rem;}"
+    ".kh{border-collapse:collapse;width:100%;font-size:0.8rem;}"
+    ".kh th{background-color:#F9FAFB;color:#9CA3AF;font-size:0.65rem;font-weight:bold;padding:0.5rem 0.3rem;"
+    "text-align:center;white-space:nowrap;border-bottom:1px solid #E5E7EB;}"
+    ".kh td{padding:0.3rem;text-align:center;white-space:nowrap;border-bottom:1px solid #E5E7EB;color:#6B7280;}"
+    ".kh td.kh-kpi{text-align:left;white-space:normal;min-width:12rem;}"
+    ".kh-kpi b{display:block;color:#1F2937;}.kh-kpi span{font-size:0.7rem;color:#9CA3AF;}"
+    ".kh td.kh-ytd{color:#111827;font-weight:bold;}.kh td.kh-ch{color:#EA580C;font-weight:bold;}"
+    ".kh td.kh-m{border-left:2px solid #FFFFFF;}.kh-m b{display:block;font-size:0.95rem;}"
+    ".kh-m span{font-size:0.7rem;color:#6B7280;}"
+    + "".join(f".kh td.kh-s{status}{{background-color:{bg};color:{txt};}}" for status, (bg, txt) in _CELL_COLORS.items())
+    + "</style>"
+)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _historic_table_html(sector: str, version: Tuple, _data: List[Dict[str, Any]]) -> str:
+    """
+    Histórico do setor numa única tabela HTML, com as cores do status já calculado no backend.
+    Cacheado por (setor, versão dos dados): só é remontado depois de refresh ou save_kpi.
+    """
+    esc = html.escape  # todos os campos já chegam como texto do backend
+    months = _data[0]["months"] if _data else {}
+    header = "".join(f"<th>{esc(m['name']).upper()}</th>" for m in months.values())
+    rows = []
+    for item in _data:
+        cells = "".join(
+            f'<td class="kh-m kh-s{m["status"]}"><b>{esc(m["actual"])}</b><span>T: {esc(m["target"])}</span></td>'
+            for m in item["months"].values()
+        )
+        rows.append(
+            f'<tr><td class="kh-kpi"><b>{esc(item["name"])}</b><span>Unit: {esc(item.get("unit", "-"))}</span></td>'
+            f'<td class="kh-ytd">{esc(item.get("ytd", "-"))}</td><td>{esc(item.get("res_2024", "-"))}</td>'
+            f'<td>{esc(item.get("target_2025", "-"))}</td><td class="kh-ch">{esc(item.get("challenge_2025", "-"))}</td>'
+            f"{cells}</tr>"
+        )
+    # Sem quebras de linha: o markdown do Streamlit trataria linhas em branco/indentadas como texto
+    return (f'{_TABLE_CSS}<div class="kh-wrap"><table class="kh"><thead><tr><th>KPI</th><th>YTD 2025</th>'
+            f"<th>'24 RESULT</th><th>'25 TARGET</th><th>'25 CHALLENGE</th>{header}</tr></thead>"
+            f'<tbody>{"".join(rows)}</tbody></table></div>')
+
 def render():
     """Renderiza a página de histórico"""
     
@@ -75,6 +169,7 @@ def render():
         # Carrega dados históricos
         with st.spinner(f'Loading historic data for {st.session_state.selected_sector}...'):
             try:
+                version = backend.get_view_version(st.session_state.selected_sector)
                 data = backend.load_historic_data(st.session_state.selected_sector)
                 
                 if not data:
@@ -82,81 +177,12 @@ def render():
                 else:
                     st.info(f"📜 {len(data)} KPIs loaded for **{st.session_state.selected_sector}**")
                     
-                    # Renderiza cada KPI
-                    for item in data:
-                        st.markdown('<div style="margin-bottom: 1rem;">', unsafe_allow_html=True)
-                        
-                        # Container principal com informações + meses
-                        col_info, col_months = st.columns([3, 9])
-                        
-                        with col_info:
-                            # Card de informações do KPI
-                            st.markdown("""
-                            <div style="background-color: #FFFFFF; border-radius: 0.3rem; padding: 1rem; min-height: 150px; border: 1px solid #E5E7EB;">
-                            """, unsafe_allow_html=True)
-                            
-                            st.markdown(f"""
-                            <div style="font-size: 1rem; font-weight: bold; color: #1F2937; margin-bottom: 0.5rem;">
-                                {item['name']}
-                            </div>
-                            <div style="font-size: 0.75rem; color: #9CA3AF; margin-bottom: 1rem;">
-                                Unit: <span style="font-weight: bold; color: #6B7280;">{item.get('unit', '-')}</span>
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            # Métricas em grid
-                            st.markdown('<div style="display: grid; grid-template-columns: 1fr 1fr; gap: 0.8rem;">', unsafe_allow_html=True)
-                            
-                            # YTD 2025
-                            st.markdown(f"""
-                            <div>
-                                <div style="font-size: 0.65rem; color: #9CA3AF; font-weight: bold;">YTD 2025</div>
-                                <div style="font-size: 1rem; color: #111827; font-weight: bold;">{item.get('ytd', '-')}</div>
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            # '24 Result
-                            st.markdown(f"""
-                            <div>
-                                <div style="font-size: 0.65rem; color: #9CA3AF; font-weight: bold;">'24 RESULT</div>
-                                <div style="font-size: 1rem; color: #6B7280;">{item.get('res_2024', '-')}</div>
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            # '25 Target
-                            st.markdown(f"""
-                            <div>
-                                <div style="font-size: 0.65rem; color: #9CA3AF; font-weight: bold;">'25 TARGET</div>
-                                <div style="font-size: 1rem; color: #6B7280;">{item.get('target_2025', '-')}</div>
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            # '25 Challenge
-                            st.markdown(f"""
-                            <div>
-                                <div style="font-size: 0.65rem; color: #9CA3AF; font-weight: bold;">'25 CHALLENGE</div>
-                                <div style="font-size: 1rem; color: #EA580C; font-weight: bold;">{item.get('challenge_2025', '-')}</div>
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            st.markdown('</div>', unsafe_allow_html=True)  # Fecha grid
-                            st.markdown('</div>', unsafe_allow_html=True)  # Fecha card
-                        
-                        with col_months:
-                            # Células dos meses em scroll horizontal
-                            st.markdown('<div style="display: flex; overflow-x: auto; gap: 0.3rem; padding: 0.5rem; background-color: #F9FAFB; border-radius: 0.3rem;">', unsafe_allow_html=True)
-                            
-                            # Cria colunas para os 12 meses
-                            month_cols = st.columns(12)
-                            for m_idx, col in enumerate(month_cols, start=1):
-                                m_data = item['months'][m_idx]
-                                with col:
-                                    render_month_cell(m_data, item['type'])
-                            
-                            st.markdown('</div>', unsafe_allow_html=True)
-                        
-                        st.markdown('</div>', unsafe_allow_html=True)
-                        st.markdown('<hr style="border: none; border-top: 1px solid #E5E7EB; margin: 1.5rem 0;">', unsafe_allow_html=True)
+                    # Tabela única (um elemento) ou um card por KPI
+                    if st.toggle("Table view", value=True, key="historic_table_mode"):
+                        st.markdown(_historic_table_html(st.session_state.selected_sector, version, data),
+                                    unsafe_allow_html=True)
+                    else:
+                        _render_cards(data)
                     
             except Exception as e:
                 st.error(f"❌ Error loading historic data: {e}")
@@ -1,8 +1,12 @@
 import streamlit as st
 from backend import backend
-from utils.models import KPI, KPIType
+from utils.models import KPI
+from utils.kpi_eval import NEUTRAL, GREEN, RED, evaluate
 from datetime import date
 
+# Cor do valor por status (NEUTRAL: sem dado para comparar)
+_STATUS_COLORS = {NEUTRAL: "#6B7280", GREEN: "#10B981", RED: "#EF4444"}
+
 def render_kpi_card(kpi: KPI, sector: str):
     """Renderiza um card de KPI individual"""
     
@@ -28,8 +32,7 @@ def render_kpi_card(kpi: KPI, sector: str):
         
         with col2:
             # Prev Achieved com cor
-            prev_is_bad = _is_performance_bad(kpi.prev_achieved, kpi.prev_target, kpi.type)
-            prev_color = "#EF4444" if prev_is_bad else "#10B981"
+            prev_color = _STATUS_COLORS[kpi.prev_status]
             st.markdown('<div class="metric-container">', unsafe_allow_html=True)
             st.markdown('<div class="metric-label">Prev Achieved</div>', unsafe_allow_html=True)
             st.markdown(f'<div class="metric-value" style="color: {prev_color}; font-weight: bold;">{kpi.prev_achieved}</div>', unsafe_allow_html=True)
@@ -47,8 +50,7 @@ def render_kpi_card(kpi: KPI, sector: str):
         with col4:
             # Actual - input ou display
             if is_locked:
-                curr_is_bad = _is_performance_bad(kpi.curr_value, kpi.curr_target, kpi.type)
-                curr_color = "#EF4444" if curr_is_bad else "#10B981"
+                curr_color = _STATUS_COLORS[kpi.curr_status]
                 st.markdown('<div class="metric-container">', unsafe_allow_html=True)
                 st.markdown('<div class="metric-label">Actual</div>', unsafe_allow_html=True)
                 st.markdown(f'<div class="metric-value" style="color: {curr_color}; font-weight: bold;">{kpi.curr_value}</div>', unsafe_allow_html=True)
@@ -70,7 +72,8 @@ def render_kpi_card(kpi: KPI, sector: str):
             else:
                 # Verifica se deve justificar
                 if kpi.curr_value and str(kpi.curr_value).strip():
-                    is_bad = _is_performance_bad(kpi.curr_value, kpi.curr_target, kpi.type)
+                    # Valor digitado agora: avaliado pela mesma regra do backend
+                    is_bad = evaluate(kpi.curr_value, kpi.curr_target, kpi.type) == RED
                     
                     if is_bad:
                         # Precisa justificar
@@ -127,37 +130,6 @@ def render_kpi_card(kpi: KPI, sector: str):
         st.markdown('</div>', unsafe_allow_html=True)
         st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 
-def _clean_float(val: str) -> float:
-    """Converte string para float"""
-    try:
-        clean = str(val).replace("%", "").strip().replace(",", "").replace("_", "")
-        if not clean:
-            return 0.0
-        return float(clean)
-    except:
-        return 0.0
-
-def _is_performance_bad(value: str, target: str, kpi_type: KPIType) -> bool:
-    """Verifica se a performance está ruim"""
-    if not value or not str(value).strip():
-        return False
-    
-    try:
-        type_str = str(kpi_type.value if isinstance(kpi_type, KPIType) else kpi_type).upper()
-        
-        if "TEXT" in type_str:
-            return str(value).strip().lower() != str(target).strip().lower()
-        
-        val_f = _clean_float(value)
-        tgt_f = _clean_float(target)
-        
-        if "LOWER" in type_str:
-            return val_f > tgt_f
-        else:
-            return val_f < tgt_f
-    except:
-        return True
-
 def render():
     """Renderiza a página de Insert Results"""
     
@@ -0,0 +1,106 @@
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List
+from utils.metrics import get_logger
+
+log = get_logger("journal")
+
+
+def read_json_lines(path: Path) -> List[Dict[str, Any]]:
+    """
+    Registros de um arquivo JSON lines append-only. Uma linha cortada por um crash (sem o
+    "\n" final ou ilegível) e o que vier depois são truncados do arquivo, para o próximo
+    append começar numa linha nova em vez de colar no lixo e se perder na leitura seguinte.
+    """
+    if not path.exists():
+        return []
+    records, good = [], 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                records.append(json.loads(line))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                break
+            good += len(line)
+        size = f.seek(0, os.SEEK_END)
+    if good < size:
+        log.warning(f"⚠️ [Cache] {path.name}: {size - good} bytes de uma escrita interrompida descartados")
+        with open(path, "r+b") as f:
+            f.truncate(good)
+            os.fsync(f.fileno())
+    return records
+
+
+class EditJournal:
+    """
+    Journal append-only (JSON lines) das edições feitas em memória.
+    Cada registro ganha um seq crescente; o snapshot guarda o último seq que já contém,
+    então no startup só os registros posteriores são reaplicados.
+    O fsync é agrupado: várias edições dentro de fsync_interval dividem um único fsync.
+    """
+
+    def __init__(self, path: Path, fsync_interval: float = 0.2):
+        self.path = path
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._sync_timer: "threading.Timer | None" = None
+        self.last_seq = 0
+        self._records = self._read()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _read(self) -> List[Dict[str, Any]]:
+        records = []
+        for record in read_json_lines(self.path):
+            self.last_seq = max(self.last_seq, record["seq"])
+            if not record.get("checkpoint"):
+                records.append(record)
+        return records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """Grava um registro (write + flush na hora, fsync agrupado) e retorna o seq"""
+        with self._lock:
+            self.last_seq += 1
+            record = dict(record, seq=self.last_seq)
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self._file.flush()
+            self._records.append(record)
+            if self._sync_timer is None:
+                self._sync_timer = threading.Timer(self.fsync_interval, self.sync)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+            return self.last_seq
+
+    def sync(self):
+        with self._lock:
+            self._sync_timer = None
+            os.fsync(self._file.fileno())
+
+    def records_after(self, seq: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [r for r in self._records if r["seq"] > seq]
+
+    def compact(self, upto_seq: int):
+        """Descarta os registros já contidos no snapshot (reescrita atômica via rename)"""
+        with self._lock:
+            kept = [r for r in self._records if r["seq"] > upto_seq]
+            if len(kept) == len(self._records):
+                return
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                # Checkpoint preserva o último seq mesmo com o journal vazio
+                f.write(json.dumps({"seq": self.last_seq, "checkpoint": True}) + "\n")
+                for r in kept:
+                    f.write(json.dumps(r, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp, self.path)
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._records = kept
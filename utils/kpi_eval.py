@@ -0,0 +1,85 @@
+from typing import Any, Tuple
+import numpy as np
+import pandas as pd
+from utils.models import KPIType
+from utils.numeric import NumericCells, parse_cell
+
+# Status de uma célula (int8 nas matrizes): sem dado, na meta, fora da meta
+NEUTRAL, GREEN, RED = 0, 1, 2
+
+# Tipo do KPI como código numérico (máscaras vetorizadas)
+TYPE_CODES = {KPIType.GREATER_THAN: 0, KPIType.LOWER_THAN: 1, KPIType.TEXT: 2}
+
+
+def _normalized_text(display: np.ndarray) -> np.ndarray:
+    """Texto sem espaços nas pontas e em minúsculas (comparação de KPIs TEXT), uma vez por texto distinto"""
+    codes, uniques = pd.factorize(display.ravel())
+    lower = pd.Series(uniques, dtype=object).str.strip().str.lower().to_numpy(dtype=object)
+    return lower[codes].reshape(display.shape)
+
+
+def _unit_values(cells: NumericCells, other: NumericCells) -> np.ndarray:
+    """
+    Valores comparáveis de um lado, sem arredondar (as 2 casas são só do display): se só este
+    lado tem "%" e o outro é uma fração que veio do Excel como número (célula formatada como
+    porcentagem, 0.93 contra "95%"), "95%" vira 0.95. Texto digitado nunca é convertido. Ilegível = 0.
+    """
+    as_fraction = cells.percent & ~other.percent & other.from_number & (np.abs(other.value) <= 1)
+    return np.where(cells.ok, np.where(as_fraction, cells.value / 100, cells.value), 0.0)
+
+
+def evaluate_cells(actual: NumericCells, target: NumericCells, type_code: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Regra única de "KPI na meta" para células (linhas x meses) já parseadas no ingest:
+    status int8 (NEUTRAL/GREEN/RED) e score do ranking. Compara os valores sem arredondar,
+    na mesma unidade ("95%" x 0.93 compara 0.95 com 0.93); número ilegível (preenchido, mas
+    não converte) fica fora da meta.
+    score = atual/meta (meta/atual para LOWER THAN), 0 quando ilegível ou sem base.
+    """
+    type_code = type_code.reshape(-1, *([1] * (actual.display.ndim - 1)))
+    valid = (actual.display != "-") & (target.display != "-")
+    a_value = _unit_values(actual, target)
+    t_value = _unit_values(target, actual)
+    is_lower = type_code == TYPE_CODES[KPIType.LOWER_THAN]
+    is_text = type_code == TYPE_CODES[KPIType.TEXT]
+
+    # TEXT: texto igual (sem caixa); demais: comparação numérica, ilegível é sempre ruim
+    unreadable = (actual.present & ~actual.ok) | (target.present & ~target.ok)
+    bad = np.where(is_lower, a_value > t_value, a_value < t_value) | unreadable
+    if is_text.any():
+        bad = np.where(is_text, _normalized_text(actual.display) != _normalized_text(target.display), bad)
+    bad = bad.astype(bool)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(is_lower,
+                         np.where(a_value > 0, t_value / np.where(a_value > 0, a_value, 1.0), 0.0),
+                         a_value / np.where(t_value != 0, t_value, 1.0))
+    score = np.where(t_value != 0, ratio, np.where(bad, 0.0, 1.0))
+    score[~actual.ok | ~target.ok | ~valid] = 0.0
+    status = np.where(valid, np.where(bad, RED, GREEN), NEUTRAL).astype(np.int8)
+    return status, score
+
+
+def evaluate(actual: Any, target: Any, kpi_type: KPIType) -> int:
+    """
+    Status de um único valor (ex.: o que o usuário está digitando), pela mesma regra do
+    evaluate_cells, mas em escalar: roda a cada rerun e a cada tecla, sem arrays nem factorize.
+    """
+    a_value, a_ok, _, a_display, a_percent, a_number = parse_cell(actual)
+    t_value, t_ok, _, t_display, t_percent, t_number = parse_cell(target)
+    if a_display == "-" or t_display == "-":
+        return NEUTRAL
+    # Mesma conversão de unidade do _unit_values
+    if a_percent and not t_percent and t_number and abs(t_value) <= 1:
+        a_value /= 100
+    elif t_percent and not a_percent and a_number and abs(a_value) <= 1:
+        t_value /= 100
+    if kpi_type == KPIType.TEXT:
+        bad = a_display.strip().lower() != t_display.strip().lower()
+    elif not (a_ok and t_ok):
+        bad = True
+    elif kpi_type == KPIType.LOWER_THAN:
+        bad = a_value > t_value
+    else:
+        bad = a_value < t_value
+    return RED if bad else GREEN
@@ -0,0 +1,215 @@
+import os
+import sys
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+SPAN_METRIC = "kpi_span_seconds"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Logger "kpi.<name>". O nível vem de KPI_LOG_LEVEL (padrão INFO): os prints
+    frequentes viraram DEBUG e só aparecem com KPI_LOG_LEVEL=DEBUG.
+    """
+    root = logging.getLogger("kpi")
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)  # mesmo destino dos prints de antes
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        root.addHandler(handler)
+        root.setLevel(os.environ.get("KPI_LOG_LEVEL", "INFO").upper())
+        root.propagate = False
+    return root.getChild(name)
+
+
+log = get_logger("metrics")
+
+
+def _labels(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metrics:
+    """
+    Registro em memória de spans (histograma de duração), contadores e gauges,
+    exportado no formato texto do Prometheus (endpoint HTTP local ou arquivo).
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._histograms: Dict[LabelKey, List] = {}  # labels -> [contagem por bucket, soma, total]
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._gauges: Dict[Tuple[str, LabelKey], float] = {}
+        self._gauge_callbacks: Dict[Tuple[str, LabelKey], Callable[[], Optional[float]]] = {}
+        self._help: Dict[str, str] = {SPAN_METRIC: "Duração das etapas do backend"}
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._file_thread: Optional[threading.Thread] = None
+
+    def observe(self, span: str, seconds: float, **labels):
+        key = _labels(dict(labels, span=span))
+        with self._lock:
+            entry = self._histograms.get(key)
+            if entry is None:
+                entry = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            position = bisect_left(self.buckets, seconds)
+            if position < len(self.buckets):
+                entry[0][position] += 1
+            entry[1] += seconds
+            entry[2] += 1
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """Cronometra o bloco (com ou sem exceção) no histograma kpi_span_seconds{span=name}"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(name, elapsed, **labels)
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(f"⏱️ [Metrics] {name} {elapsed * 1000:.1f} ms {labels or ''}")
+
+    def inc(self, name: str, value: float = 1, help: Optional[str] = None, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            if help:
+                self._help.setdefault(name, help)
+
+    def set_gauge(self, name: str, value: float, help: Optional[str] = None, **labels):
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+            if help:
+                self._help.setdefault(name, help)
+
+    def gauge_callback(self, name: str, fn: Callable[[], Optional[float]], help: Optional[str] = None, **labels):
+        """Gauge lido na hora da exportação (ex.: tamanho da fila); None omite a amostra"""
+        with self._lock:
+            self._gauge_callbacks[(name, _labels(labels))] = fn
+            if help:
+                self._help.setdefault(name, help)
+
+    def render(self) -> str:
+        """Texto no formato de exposição do Prometheus (text/plain; version=0.0.4)"""
+        with self._lock:
+            histograms = {k: (list(v[0]), v[1], v[2]) for k, v in self._histograms.items()}
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            callbacks = dict(self._gauge_callbacks)
+            help_texts = dict(self._help)
+        for key, fn in callbacks.items():
+            try:
+                value = fn()
+            except Exception:
+                value = None
+            if value is not None:
+                gauges[key] = value
+
+        lines: List[str] = []
+
+        def header(name: str, kind: str):
+            if name in help_texts:
+                lines.append(f"# HELP {name} {help_texts[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        if histograms:
+            header(SPAN_METRIC, "histogram")
+            for labels, (counts, total, count) in sorted(histograms.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets, counts):
+                    cumulative += n
+                    lines.append(f"{SPAN_METRIC}_bucket{_format_labels(labels, (('le', _format_value(bound)),))} {cumulative}")
+                lines.append(f"{SPAN_METRIC}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+                lines.append(f"{SPAN_METRIC}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{SPAN_METRIC}_count{_format_labels(labels)} {count}")
+
+        for kind, samples in (("counter", counters), ("gauge", gauges)):
+            for name in sorted({name for name, _ in samples}):
+                header(name, kind)
+                for (sample_name, labels), value in sorted(samples.items()):
+                    if sample_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        """Grava render() com rename atômico (textfile collector do node_exporter)"""
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def start_file_export(self, path, interval: float = 15.0):
+        if self._file_thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    self.write_file(path)
+                except OSError as e:
+                    log.warning(f"⚠️ [Metrics] Não foi possível gravar {path}: {e}")
+                time.sleep(interval)
+
+        self._file_thread = threading.Thread(target=loop, name="kpi-metrics-file", daemon=True)
+        self._file_thread.start()
+        log.info(f"📊 [Metrics] Exportando para {path} a cada {interval:g}s")
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Endpoint local GET /metrics numa thread daemon"""
+        if self._server is not None:
+            return
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="kpi-metrics-http", daemon=True).start()
+        log.info(f"📊 [Metrics] Endpoint em http://{host}:{port}/metrics")
+
+    def start_exporters_from_env(self):
+        """KPI_METRICS_PORT liga o endpoint HTTP; KPI_METRICS_FILE, a exportação em arquivo"""
+        port = os.environ.get("KPI_METRICS_PORT")
+        if port:
+            try:
+                self.serve(int(port), os.environ.get("KPI_METRICS_HOST", "127.0.0.1"))
+            except OSError as e:  # outra instância do app já usa a porta
+                log.warning(f"⚠️ [Metrics] Endpoint não iniciado na porta {port}: {e}")
+        path = os.environ.get("KPI_METRICS_FILE")
+        if path:
+            self.start_file_export(path)
+
+
+metrics = Metrics()
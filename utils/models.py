@@ -19,4 +19,6 @@ class KPI:
     justification: str = ""
     countermeasure: str = ""
     countermeasure_date: str = ""
-    countermeasure_resp: str = ""
\ No newline at end of file
+    countermeasure_resp: str = ""
+    prev_status: int = 0  # utils.kpi_eval: NEUTRAL / GREEN / RED do mês anterior
+    curr_status: int = 0  # idem para o valor salvo no mês avaliado
\ No newline at end of file
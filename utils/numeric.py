@@ -0,0 +1,118 @@
+import math
+from dataclasses import dataclass, fields
+from typing import Any, Tuple
+import numpy as np
+import pandas as pd
+
+
+def format_number(value: float) -> str:
+    """Mesmo formato do histórico: inteiros sem casas decimais, demais com 2 casas"""
+    if value.is_integer(): return str(int(value))
+    return f"{value:.2f}"
+
+
+# "%", "," e "_" não fazem parte do número ("95%", "1,200", "1_000")
+_NOT_NUMERIC = str.maketrans("", "", "%,_")
+
+
+def _to_float(text: str) -> float:
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+# (value, ok, present, display, percent, from_number): mesma ordem dos campos de NumericCells
+ParsedCell = Tuple[float, bool, bool, Any, bool, bool]
+_EMPTY_CELL: ParsedCell = (np.nan, False, False, "-", False, False)
+
+
+def _is_number(raw: Any) -> bool:
+    """Célula que veio do Excel como número (não texto digitado); booleanos não contam"""
+    return isinstance(raw, (int, float, np.number)) and not isinstance(raw, (bool, np.bool_))
+
+
+def _parse_text(text: str) -> Tuple[float, bool, bool, Any, bool]:
+    """Regra de parse de um texto: a mesma para o ingest (por texto distinto) e para um valor avulso"""
+    value = _to_float(text.translate(_NOT_NUMERIC))
+    present = text.strip() != ""  # Células só com espaços contam como vazias
+    # "nan" digitado também é ilegível (não um número)
+    if math.isnan(value):
+        return value, False, present, text if present else "-", "%" in text
+    return value, True, present, format_number(value), "%" in text
+
+
+def parse_cell(raw: Any) -> ParsedCell:
+    """Uma única célula, sem montar arrays (render loops, digitação); mesmo resultado do parse_numeric"""
+    return _EMPTY_CELL if pd.isna(raw) else (*_parse_text(str(raw)), _is_number(raw))
+
+
+@dataclass
+class NumericCells:
+    """Células numéricas já parseadas, todas com o mesmo shape da matriz original"""
+    value: np.ndarray    # float64 (NaN onde não há número válido)
+    ok: np.ndarray       # bool: célula convertida com sucesso
+    present: np.ndarray  # bool: célula não vazia
+    display: np.ndarray  # object: texto canônico ("-" para vazias, o texto original se ilegível)
+    percent: np.ndarray  # bool: valor digitado com "%" (a unidade não entra em value)
+    from_number: np.ndarray  # bool: veio do Excel como número, não como texto
+
+    def take(self, positions: np.ndarray) -> "NumericCells":
+        return NumericCells(*(getattr(self, f.name)[positions] for f in fields(self)))
+
+    def copy(self) -> "NumericCells":
+        return NumericCells(*(getattr(self, f.name).copy() for f in fields(self)))
+
+    def set_cell(self, key, raw):
+        """Reparseia uma única célula (usado quando save_kpi altera o cache)"""
+        for f, parsed in zip(fields(self), parse_cell(raw)):
+            getattr(self, f.name)[key] = parsed
+
+
+def parse_numeric(values: np.ndarray) -> NumericCells:
+    """
+    Parse vetorizado de células com texto misto ("95%", "1,200", "1_000", 0.5, None...).
+    Cada texto distinto é convertido uma única vez e o resultado é espalhado
+    de volta para todas as células via factorize.
+    "%", "," e "_" são ignorados no número; texto que mesmo assim não converte fica
+    com ok=False e é exibido como veio.
+    """
+    values = np.asarray(values, dtype=object)
+    flat = values.ravel()
+    value = np.full(flat.shape, np.nan, dtype=np.float64)
+    ok = np.zeros(flat.shape, dtype=bool)
+    present = np.zeros(flat.shape, dtype=bool)
+    display = np.full(flat.shape, "-", dtype=object)
+    percent = np.zeros(flat.shape, dtype=bool)
+    from_number = np.zeros(flat.shape, dtype=bool)
+
+    not_null = np.flatnonzero(~pd.isna(flat))
+    if len(not_null):
+        raws = flat[not_null].tolist()
+        texts = np.array([str(v) for v in raws], dtype=object)
+        from_number[not_null] = [_is_number(v) for v in raws]
+        codes, uniques = pd.factorize(texts)
+        parsed = list(zip(*(_parse_text(t) for t in uniques.tolist())))
+        u_value, u_ok, u_present, u_percent = (
+            np.array(parsed[i], dtype=dtype) for i, dtype in
+            ((0, np.float64), (1, bool), (2, bool), (4, bool)))
+        u_display = np.empty(len(uniques), dtype=object)
+        u_display[:] = parsed[3]
+
+        value[not_null] = u_value[codes]
+        ok[not_null] = u_ok[codes]
+        present[not_null] = u_present[codes]
+        display[not_null] = u_display[codes]
+        percent[not_null] = u_percent[codes]
+
+    shape = values.shape
+    return NumericCells(*(a.reshape(shape) for a in (value, ok, present, display, percent, from_number)))
+
+
+def columns_matrix(df: pd.DataFrame, columns) -> np.ndarray:
+    """Empilha colunas do DataFrame numa matriz object (colunas ausentes viram None)"""
+    matrix = np.full((len(df), len(columns)), None, dtype=object)
+    for j, col in enumerate(columns):
+        if col in df.columns:
+            matrix[:, j] = df[col].to_numpy(dtype=object)
+    return matrix
@@ -0,0 +1,99 @@
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+from utils.journal import read_json_lines
+
+QueueKey = Tuple[str, str, str]
+
+
+class PendingQueue:
+    """
+    Fila de pendências indexada por (setor, kpi_id, mês): upsert e remoção O(1).
+    Persistência incremental: cada operação é uma linha no log (.log); de tempos em
+    tempos o estado inteiro é gravado no JSON base (mesmo formato de lista de antes)
+    via rename atômico e o log é zerado.
+    """
+
+    def __init__(self, path: Path, compact_min_ops: int = 64):
+        self.path = path
+        self.log_path = path.with_suffix(".log")
+        self.compact_min_ops = compact_min_ops
+        self._lock = threading.RLock()
+        self._items: Dict[QueueKey, Dict[str, Any]] = {}
+        self._log_ops = 0
+        self._load()
+        self._log = open(self.log_path, "a", encoding="utf-8")
+
+    @staticmethod
+    def key(item: Dict[str, Any]) -> QueueKey:
+        return item["sector"], str(item["kpi_id"]), item["month_suffix"]
+
+    def _load(self):
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for item in json.load(f):
+                    self._items.pop(self.key(item), None)
+                    self._items[self.key(item)] = item
+        # Uma operação cortada por um crash é truncada do log antes de reabri-lo para append
+        for op in read_json_lines(self.log_path):
+            self._apply(op)
+            self._log_ops += 1
+
+    def _apply(self, op: Dict[str, Any]):
+        if op["op"] == "put":
+            key = self.key(op["item"])
+            self._items.pop(key, None)  # reinserir move o item para o fim, como antes
+            self._items[key] = op["item"]
+        else:
+            self._items.pop(tuple(op["key"]), None)
+
+    def _write_ops(self, ops: List[Dict[str, Any]]):
+        if not ops:
+            return
+        for op in ops:
+            self._apply(op)
+        self._log.write("".join(json.dumps(op, ensure_ascii=False, default=str) + "\n" for op in ops))
+        self._log.flush()
+        self._log_ops += len(ops)
+        if self._log_ops >= max(self.compact_min_ops, 2 * len(self._items)):
+            self.compact()
+
+    def upsert(self, item: Dict[str, Any]):
+        """Adiciona ou substitui a pendência do mesmo (setor, KPI, mês)"""
+        with self._lock:
+            self._write_ops([{"op": "put", "item": item}])
+
+    def remove(self, keys: Iterable[QueueKey]):
+        with self._lock:
+            self._write_ops([{"op": "del", "key": list(k)} for k in set(keys) if k in self._items])
+
+    def remove_items(self, items: Iterable[Dict[str, Any]]):
+        """Remove só se a pendência ainda for a mesma (uma edição mais nova continua na fila)"""
+        with self._lock:
+            keys = [self.key(item) for item in items if self._items.get(self.key(item)) == item]
+            self.remove(keys)
+
+    def compact(self):
+        """Grava o estado inteiro no JSON base (rename atômico) e zera o log"""
+        with self._lock:
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(list(self._items.values()), f, indent=2, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._log.close()
+            self._log = open(self.log_path, "w", encoding="utf-8")
+            self._log_ops = 0
+
+    def items(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._items.values())
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self.items())
@@ -0,0 +1,122 @@
+import time
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import requests
+from office365.runtime.auth.client_credential import ClientCredential
+from office365.sharepoint.client_context import ClientContext
+from utils.metrics import get_logger
+
+log = get_logger("sharepoint")
+
+
+class ContextProvider(ABC):
+    """
+    Interface de quem entrega o ClientContext ao backend. O backend só usa lease():
+    o contexto é emprestado durante uma operação e devolvido no fim (ou descartado se falhar).
+    """
+
+    @abstractmethod
+    def acquire(self) -> Any:
+        ...
+
+    def release(self, ctx: Any, error: Optional[BaseException] = None):
+        pass
+
+    def invalidate(self):
+        pass
+
+    @contextmanager
+    def lease(self):
+        ctx = self.acquire()
+        try:
+            yield ctx
+        except BaseException as e:
+            self.release(ctx, e)
+            raise
+        self.release(ctx)
+
+
+class FactoryContextProvider(ContextProvider):
+    """Sem pool: chama a fábrica a cada operação (substitutos locais / testes)"""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self.factory = factory
+
+    def acquire(self) -> Any:
+        return self.factory()
+
+
+def is_auth_error(error: Optional[BaseException]) -> bool:
+    """401/403 do SharePoint: o token em cache expirou ou foi revogado"""
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) in (401, 403)
+
+
+class PooledContextProvider(ContextProvider):
+    """
+    Pool de ClientContext autenticados. O token fica em cache dentro do contexto
+    (o office365 autentica na primeira requisição e reaproveita depois), então o
+    contexto é reutilizado até token_lifetime - refresh_margin segundos e só então
+    recriado, na próxima vez que alguém pedir (refresh preguiçoso).
+    Todos os contextos dividem uma requests.Session: conexões keep-alive reaproveitadas.
+    Cada operação recebe um contexto exclusivo, já que a fila de queries não é thread-safe.
+    """
+
+    def __init__(self, site_url: str, client_id: str, client_secret: str,
+                 token_lifetime: float = 3600, refresh_margin: float = 300, max_idle: int = 2):
+        self.site_url = site_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_lifetime = token_lifetime
+        self.refresh_margin = refresh_margin
+        self.max_idle = max_idle
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._idle: List[Tuple[Any, float]] = []  # (contexto, criado em - monotonic)
+        self._leased: Dict[int, Tuple[float, int]] = {}  # id(contexto) -> (criado em, geração)
+        self._generation = 0  # invalidate() incrementa: contextos antigos não voltam ao pool
+
+    def _expired(self, created_at: float) -> bool:
+        # A idade conta da criação do contexto, antes do token: estimativa conservadora
+        return time.monotonic() - created_at >= self.token_lifetime - self.refresh_margin
+
+    def _create(self) -> Any:
+        ctx = ClientContext(self.site_url).with_credentials(ClientCredential(self.client_id, self.client_secret))
+        if hasattr(ctx, "with_transport"):  # versões antigas do office365 não aceitam session
+            ctx.with_transport(session=self.session)
+        log.info("🔑 [SharePoint] Novo contexto autenticado criado")
+        return ctx
+
+    def acquire(self) -> Any:
+        with self._lock:
+            while self._idle:
+                ctx, created_at = self._idle.pop()
+                if not self._expired(created_at):
+                    break
+            else:
+                ctx, created_at = None, time.monotonic()
+            generation = self._generation
+        if ctx is None:
+            ctx = self._create()
+        with self._lock:
+            self._leased[id(ctx)] = (created_at, generation)
+        return ctx
+
+    def release(self, ctx: Any, error: Optional[BaseException] = None):
+        with self._lock:
+            created_at, generation = self._leased.pop(id(ctx), (None, None))
+            if created_at is None or generation != self._generation:
+                return
+            # Queries que sobraram de uma falha iriam junto na próxima operação
+            if is_auth_error(error) or getattr(ctx, "has_pending_request", False):
+                return
+            if not self._expired(created_at) and len(self._idle) < self.max_idle:
+                self._idle.append((ctx, created_at))
+
+    def invalidate(self):
+        """Descarta todos os contextos (ex.: segredo trocado); o próximo acquire reautentica"""
+        with self._lock:
+            self._idle.clear()
+            self._generation += 1
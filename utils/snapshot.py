@@ -0,0 +1,151 @@
+import os
+import json
+import pickle
+import datetime as dt
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow é opcional: sem ele o snapshot usa pickle
+    pa = None
+    feather = None
+
+SNAPSHOT_ARROW = "df_snapshot.arrow"
+SNAPSHOT_PICKLE = "df_snapshot.pkl"
+SNAPSHOT_META = "df_snapshot.json"
+
+# Colunas object do Excel misturam textos, números e datas na mesma coluna.
+# No Arrow elas viram texto + um código de tipo por célula, para voltar idênticas.
+_KIND_SUFFIX = "\x1fkind"
+_NULL, _STR, _INT, _FLOAT, _BOOL, _TIMESTAMP, _DATETIME, _DATE, _TIME = range(9)
+_DECODERS = {
+    _INT: int,
+    _FLOAT: float,
+    _BOOL: lambda text: text == "True",
+    _TIMESTAMP: pd.Timestamp,
+    _DATETIME: dt.datetime.fromisoformat,
+    _DATE: dt.date.fromisoformat,
+    _TIME: dt.time.fromisoformat,
+}
+
+
+def _encode_cell(value) -> Optional[Tuple[int, Optional[str]]]:
+    if type(value) is str: return _STR, value
+    if pd.isna(value): return _NULL, None
+    if isinstance(value, (bool, np.bool_)): return _BOOL, str(bool(value))
+    if isinstance(value, (int, np.integer)): return _INT, str(int(value))
+    if isinstance(value, (float, np.floating)): return _FLOAT, repr(float(value))
+    if isinstance(value, pd.Timestamp): return _TIMESTAMP, value.isoformat()
+    if isinstance(value, dt.datetime): return _DATETIME, value.isoformat()
+    if isinstance(value, dt.date): return _DATE, value.isoformat()
+    if isinstance(value, dt.time): return _TIME, value.isoformat()
+    if isinstance(value, str): return _STR, str(value)
+    return None
+
+
+def _encode_object_column(values: np.ndarray) -> Optional[Tuple[List[Optional[str]], np.ndarray]]:
+    texts: List[Optional[str]] = []
+    kinds = np.empty(len(values), dtype=np.int8)
+    for i, value in enumerate(values.tolist()):
+        encoded = _encode_cell(value)
+        if encoded is None:
+            return None
+        kinds[i], text = encoded
+        texts.append(text)
+    return texts, kinds
+
+
+def _decode_object_column(texts: List[Optional[str]], kinds: np.ndarray) -> np.ndarray:
+    texts_arr = np.array(texts, dtype=object)
+    out = np.full(len(kinds), np.nan, dtype=object)
+    is_str = kinds == _STR
+    out[is_str] = texts_arr[is_str]
+    for kind, decode in _DECODERS.items():
+        positions = np.flatnonzero(kinds == kind)
+        if len(positions):
+            out[positions] = [decode(t) for t in texts_arr[positions].tolist()]
+    return out
+
+
+def _to_arrow(df: pd.DataFrame) -> Optional["pa.Table"]:
+    columns = list(df.columns)
+    if not all(isinstance(c, str) for c in columns) or len(set(columns)) != len(columns):
+        return None
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        return None
+
+    arrays, names = [], []
+    for col in columns:
+        series = df[col]
+        if series.dtype == object:
+            encoded = _encode_object_column(series.to_numpy(dtype=object))
+            if encoded is None:
+                return None
+            texts, kinds = encoded
+            arrays += [pa.array(texts, type=pa.string()), pa.array(kinds, type=pa.int8())]
+            names += [col, col + _KIND_SUFFIX]
+        else:
+            arrays.append(pa.Array.from_pandas(series))
+            names.append(col)
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def _from_arrow(table: "pa.Table", columns: List[str]) -> pd.DataFrame:
+    names = set(table.column_names)
+    data = {}
+    for col in columns:
+        if col + _KIND_SUFFIX in names:
+            kinds = table.column(col + _KIND_SUFFIX).to_numpy()
+            data[col] = pd.Series(_decode_object_column(table.column(col).to_pylist(), kinds), dtype=object)
+        else:
+            data[col] = table.column(col).to_pandas()
+    return pd.DataFrame(data, columns=columns)
+
+
+def _atomic_write(path: Path, write):
+    tmp = path.with_name(path.name + ".tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def save_snapshot(directory: Path, df: pd.DataFrame, metadata: Dict[str, Any]) -> str:
+    """
+    Persiste df + metadados em directory. Usa Arrow IPC (feather) quando pyarrow
+    está instalado e o frame é representável; caso contrário cai para pickle.
+    Retorna o formato usado.
+    """
+    table = _to_arrow(df) if pa is not None else None
+    if table is not None:
+        fmt = "arrow"
+        _atomic_write(directory / SNAPSHOT_ARROW,
+                      lambda tmp: feather.write_feather(table, str(tmp), compression="uncompressed"))
+    else:
+        fmt = "pickle"
+        _atomic_write(directory / SNAPSHOT_PICKLE,
+                      lambda tmp: df.to_pickle(tmp, protocol=pickle.HIGHEST_PROTOCOL))
+
+    meta = dict(metadata, format=fmt, columns=[str(c) for c in df.columns])
+    # O JSON de metadados é gravado por último: ele é quem "publica" o snapshot
+    _atomic_write(directory / SNAPSHOT_META,
+                  lambda tmp: tmp.write_text(json.dumps(meta, ensure_ascii=False, default=str), encoding="utf-8"))
+    return fmt
+
+
+def load_snapshot(directory: Path) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+    """Carrega o último snapshot válido, ou None se não houver / estiver corrompido"""
+    meta_path = directory / SNAPSHOT_META
+    if not meta_path.exists():
+        return None
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    if meta.get("format") == "arrow":
+        if feather is None:
+            return None
+        table = feather.read_table(str(directory / SNAPSHOT_ARROW), memory_map=True)
+        df = _from_arrow(table, meta["columns"])
+    else:
+        df = pd.read_pickle(directory / SNAPSHOT_PICKLE)
+    return df, meta
@@ -0,0 +1,103 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+import numpy as np
+from utils.kpi_eval import GREEN, NEUTRAL, evaluate_cells
+from utils.numeric import NumericCells
+
+
+@dataclass
+class StatusCube:
+    """
+    Avaliação de todas as células KPI x mês, agregada por setor (chave normalizada) no refresh.
+    O dashboard só soma contagens e junta rankings já ordenados; save_kpi troca as células
+    editadas com with_cells (copy-on-write, só os setores tocados são recalculados).
+    """
+    status: np.ndarray   # int8 (linhas x 12): NEUTRAL / GREEN / RED (utils.kpi_eval)
+    score: np.ndarray    # float64: score do ranking (0 = fora do ranking)
+    sector_index: Dict[str, np.ndarray]
+    row_sector: np.ndarray                 # object: setor de cada linha
+    counts: Dict[str, np.ndarray]          # setor -> int64 (12, 2): [KPIs avaliados, na meta] por mês
+    ranked: Dict[str, List[np.ndarray]]    # setor -> por mês, linhas ranqueadas por score decrescente
+
+    @classmethod
+    def build(cls, actual: NumericCells, target: NumericCells, type_code: np.ndarray,
+              sector_index: Dict[str, np.ndarray]) -> "StatusCube":
+        status, score = evaluate_cells(actual, target, type_code)
+        row_sector = np.full(len(type_code), "", dtype=object)
+        for key, positions in sector_index.items():
+            row_sector[positions] = key
+        cube = cls(status, score, sector_index, row_sector, {}, {})
+        for key in sector_index:
+            cube._aggregate_sector(key)
+        return cube
+
+    def _aggregate_sector(self, key: str, months: Iterable[int] = range(12)):
+        """Recalcula contagens e rankings de um setor nos meses dados (in-place)"""
+        positions = self.sector_index[key]
+        counts = self.counts.get(key)
+        counts = np.zeros((12, 2), dtype=np.int64) if counts is None else counts.copy()
+        ranked = list(self.ranked.get(key, [np.empty(0, dtype=np.intp)] * 12))
+        for month in months:
+            status = self.status[positions, month]
+            counts[month] = ((status != NEUTRAL).sum(), (status == GREEN).sum())
+            score = self.score[positions, month]
+            rows = positions[(score != 0.0) & ~np.isnan(score)]
+            # Estável: empates ficam na ordem da planilha
+            ranked[month] = rows[np.argsort(-self.score[rows, month], kind="stable")]
+        self.counts[key] = counts
+        self.ranked[key] = ranked
+
+    def with_cells(self, rows: Iterable[int], month: int, actual: NumericCells, target: NumericCells,
+                   type_code: np.ndarray) -> "StatusCube":
+        """Novo cubo com as células (linhas, mês 0-11) reavaliadas a partir das matrizes do histórico"""
+        rows = np.array(sorted(set(rows)), dtype=np.intp)
+        status, score = self.status.copy(), self.score.copy()
+        cells = (rows, np.full(len(rows), month))
+        status[cells], score[cells] = evaluate_cells(actual.take(cells), target.take(cells), type_code[rows])
+        cube = StatusCube(status, score, self.sector_index, self.row_sector,
+                          dict(self.counts), dict(self.ranked))
+        for key in set(self.row_sector[rows].tolist()):
+            if key in self.sector_index:
+                cube._aggregate_sector(key, [month])
+        return cube
+
+    def totals(self, sector_keys: Iterable[str]) -> np.ndarray:
+        """(12, 2) [KPIs avaliados, na meta] somados sobre os setores: série mensal do escopo"""
+        total = np.zeros((12, 2), dtype=np.int64)
+        for key in sector_keys:
+            if key in self.counts:
+                total += self.counts[key]
+        return total
+
+    def ranking(self, month: int, sector_keys: Iterable[str], head: int = None, tail: int = None) -> np.ndarray:
+        """
+        Linhas ranqueadas do escopo (score decrescente; empates na ordem setor -> linha).
+        head/tail limitam a junção aos primeiros/últimos de cada setor: top/bottom sem ordenar tudo.
+        """
+        parts = []
+        for key in sector_keys:
+            rows = self.ranked.get(key)
+            if rows is None:
+                continue
+            rows = rows[month]
+            if head is not None:
+                rows = rows[:head]
+            elif tail is not None:
+                rows = rows[max(len(rows) - tail, 0):]
+            parts.append(rows)
+        rows = np.concatenate(parts) if parts else np.empty(0, dtype=np.intp)
+        order = rows[np.argsort(-self.score[rows, month], kind="stable")]
+        if head is not None:
+            return order[:head]
+        if tail is not None:
+            return order[max(len(order) - tail, 0):]
+        return order
+
+    def ranked_count(self, month: int, sector_keys: Iterable[str]) -> int:
+        return sum(len(self.ranked[key][month]) for key in sector_keys if key in self.ranked)
+
+    def best_score(self, month: int, sector_keys: Iterable[str]) -> float:
+        """Maior score do escopo no mês (NaN se ninguém foi ranqueado)"""
+        firsts = [self.ranked[key][month][:1] for key in sector_keys if key in self.ranked]
+        rows = np.concatenate(firsts) if firsts else np.empty(0, dtype=np.intp)
+        return float(self.score[rows, month].max()) if len(rows) else float("nan")
@@ -0,0 +1,155 @@
+import io
+import os
+import time
+import random
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+from utils.sharepoint_context import ContextProvider
+
+
+class StorageLockedError(Exception):
+    """Arquivo remoto travado (aberto por outro usuário / checked out): vale tentar de novo"""
+
+
+class StorageDriver(ABC):
+    """
+    Onde mora o KPISystem.xlsx. O backend só conhece estes três métodos;
+    metadata() serve para o download condicional (None = não dá para comparar versões).
+    """
+
+    name = "storage"
+
+    @abstractmethod
+    def metadata(self) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def download(self) -> bytes:
+        ...
+
+    @abstractmethod
+    def upload(self, content: bytes) -> Optional[Dict[str, Any]]:
+        """Sobrescreve o arquivo e retorna os metadados da versão gravada"""
+
+
+class SharePointDriver(StorageDriver):
+    name = "SharePoint"
+
+    def __init__(self, context_provider: ContextProvider, file_url: str):
+        self.context_provider = context_provider
+        self.file_url = file_url
+        self.folder_url, self.file_name = file_url.rsplit("/", 1)
+
+    @staticmethod
+    def metadata_from_file(remote_file) -> Optional[Dict[str, Any]]:
+        """Extrai ETag / TimeLastModified / tamanho das propriedades do arquivo remoto"""
+        props = getattr(remote_file, "properties", None) or {}
+        metadata = {
+            "etag": props.get("ETag"),
+            "modified": str(props.get("TimeLastModified")) if props.get("TimeLastModified") else None,
+            "size": props.get("Length"),
+        }
+        # Sem nenhum identificador não dá para comparar versões com segurança
+        if not any(metadata.values()):
+            return None
+        return metadata
+
+    def metadata(self) -> Optional[Dict[str, Any]]:
+        with self.context_provider.lease() as ctx:
+            remote_file = ctx.web.get_file_by_server_relative_path(self.file_url).get().execute_query()
+        return self.metadata_from_file(remote_file)
+
+    def download(self) -> bytes:
+        response = io.BytesIO()
+        with self.context_provider.lease() as ctx:
+            ctx.web.get_file_by_server_relative_path(self.file_url).download(response).execute_query()
+        return response.getvalue()
+
+    def upload(self, content: bytes) -> Optional[Dict[str, Any]]:
+        with self.context_provider.lease() as ctx:
+            uploaded = ctx.web.get_folder_by_server_relative_url(self.folder_url) \
+                .upload_file(self.file_name, content) \
+                .execute_query()
+        return self.metadata_from_file(uploaded)
+
+
+class LocalDirectoryDriver(StorageDriver):
+    """
+    Arquivo num diretório local ou compartilhamento de rede (offline, testes, segundo site).
+    O Excel cria ~$KPISystem.xlsx ao lado do arquivo aberto: com ele presente o upload
+    falha como travado, igual ao SharePoint com o Admin editando.
+    """
+
+    name = "Local"
+
+    def __init__(self, directory, file_name: str = "KPISystem.xlsx"):
+        self.path = Path(directory) / file_name
+        self.lock_path = Path(directory) / ("~$" + file_name)
+
+    def metadata(self) -> Optional[Dict[str, Any]]:
+        stat = self.path.stat()
+        return {
+            "etag": f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+            "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            "size": stat.st_size,
+        }
+
+    def download(self) -> bytes:
+        return self.path.read_bytes()
+
+    def upload(self, content: bytes) -> Optional[Dict[str, Any]]:
+        if self.lock_path.exists():
+            raise StorageLockedError(f"{self.path.name} is locked for editing ({self.lock_path.name})")
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_bytes(content)
+        try:
+            os.replace(tmp, self.path)
+        except PermissionError as e:  # Windows: arquivo aberto por outro processo
+            tmp.unlink(missing_ok=True)
+            raise StorageLockedError(f"{self.path.name} is locked: {e}") from e
+        return self.metadata()
+
+
+class SimulatedDriver(StorageDriver):
+    """
+    Envolve outro driver com latência e erros de lock simulados, para medir refresh/save
+    de forma reproduzível (mesmo seed -> mesma sequência de atrasos e falhas).
+    calls conta as chamadas por método.
+    """
+
+    def __init__(self, inner: StorageDriver, latency: float = 0.0, jitter: float = 0.0,
+                 lock_error_rate: float = 0.0, seed: Optional[int] = None):
+        self.inner = inner
+        self.name = f"Simulado({inner.name})"
+        self.latency = latency
+        self.jitter = jitter
+        self.lock_error_rate = lock_error_rate
+        self.calls = {"metadata": 0, "download": 0, "upload": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _round_trip(self, method: str) -> bool:
+        """Conta a chamada, espera a latência sorteada e diz se esta chamada falha com lock"""
+        with self._lock:
+            self.calls[method] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            locked = self._random.random() < self.lock_error_rate
+        if delay > 0:
+            time.sleep(delay)
+        return locked
+
+    def metadata(self) -> Optional[Dict[str, Any]]:
+        self._round_trip("metadata")
+        return self.inner.metadata()
+
+    def download(self) -> bytes:
+        self._round_trip("download")
+        return self.inner.download()
+
+    def upload(self, content: bytes) -> Optional[Dict[str, Any]]:
+        if self._round_trip("upload"):
+            raise StorageLockedError("The file is locked for shared use (simulated)")
+        return self.inner.upload(content)
@@ -0,0 +1,53 @@
+from utils.journal import EditJournal, read_json_lines
+
+
+def _reopen(journal: EditJournal) -> EditJournal:
+    """Simula o restart do processo: fecha o arquivo e lê de novo do disco"""
+    journal._file.close()
+    return EditJournal(journal.path)
+
+
+def test_records_survive_reopen(tmp_path):
+    journal = EditJournal(tmp_path / "edits.jsonl")
+    assert journal.append({"kpi_id": "1"}) == 1
+    assert journal.append({"kpi_id": "2"}) == 2
+
+    journal = _reopen(journal)
+    assert [r["kpi_id"] for r in journal.records_after(0)] == ["1", "2"]
+    assert journal.last_seq == 2
+    assert journal.append({"kpi_id": "3"}) == 3
+
+
+def test_torn_line_is_truncated_before_appending(tmp_path):
+    journal = EditJournal(tmp_path / "edits.jsonl")
+    journal.append({"kpi_id": "1"})
+    journal._file.close()
+    # Crash no meio de uma escrita: linha cortada, sem "\n"
+    with open(journal.path, "ab") as f:
+        f.write(b'{"kpi_id": "2", "se')
+
+    journal = EditJournal(journal.path)
+    journal.append({"kpi_id": "3"})
+    journal = _reopen(journal)
+    assert [r["kpi_id"] for r in journal.records_after(0)] == ["1", "3"]
+    assert [r["seq"] for r in read_json_lines(journal.path)] == [1, 2]
+
+
+def test_unreadable_line_drops_the_rest(tmp_path):
+    path = tmp_path / "edits.jsonl"
+    path.write_bytes(b'{"seq": 1}\nlixo\n{"seq": 3}\n')
+    assert read_json_lines(path) == [{"seq": 1}]
+    assert path.read_bytes() == b'{"seq": 1}\n'
+
+
+def test_compact_keeps_later_records_and_seq(tmp_path):
+    journal = EditJournal(tmp_path / "edits.jsonl")
+    for kpi_id in "123":
+        journal.append({"kpi_id": kpi_id})
+    journal.compact(2)
+    assert [r["kpi_id"] for r in journal.records_after(0)] == ["3"]
+
+    journal.compact(3)
+    journal = _reopen(journal)
+    assert len(journal) == 0
+    assert journal.append({"kpi_id": "4"}) == 4  # o checkpoint preserva o último seq
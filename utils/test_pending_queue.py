@@ -0,0 +1,48 @@
+from utils.pending_queue import PendingQueue
+
+
+def _item(kpi_id: str, value: str = "1", sector: str = "Brand", suffix: str = "Jan"):
+    return {"sector": sector, "kpi_id": kpi_id, "month_suffix": suffix, "data": {"curr_value": value}}
+
+
+def _reopen(queue: PendingQueue) -> PendingQueue:
+    """Simula o restart do processo: fecha o log e lê de novo do disco"""
+    queue._log.close()
+    return PendingQueue(queue.path)
+
+
+def test_operations_survive_reopen(tmp_path):
+    queue = PendingQueue(tmp_path / "pending_queue.json")
+    queue.upsert(_item("1"))
+    queue.upsert(_item("2"))
+    queue.upsert(_item("1", value="9"))
+    queue.remove([PendingQueue.key(_item("2"))])
+
+    queue = _reopen(queue)
+    assert [(i["kpi_id"], i["data"]["curr_value"]) for i in queue.items()] == [("1", "9")]
+
+
+def test_torn_operation_is_truncated_before_appending(tmp_path):
+    queue = PendingQueue(tmp_path / "pending_queue.json")
+    queue.upsert(_item("1"))
+    queue._log.close()
+    # Crash no meio de uma escrita: operação cortada, sem "\n"
+    with open(queue.log_path, "ab") as f:
+        f.write(b'{"op": "put", "it')
+
+    queue = PendingQueue(queue.path)
+    queue.upsert(_item("2"))
+    queue = _reopen(queue)
+    assert [i["kpi_id"] for i in queue.items()] == ["1", "2"]
+
+
+def test_compact_moves_state_to_base_file(tmp_path):
+    queue = PendingQueue(tmp_path / "pending_queue.json")
+    for kpi_id in "1234":
+        queue.upsert(_item(kpi_id))
+    queue.compact()
+    assert queue.log_path.read_text(encoding="utf-8") == ""
+
+    queue.remove_items([_item("1"), _item("2", value="outro")])  # só remove se ainda for o mesmo
+    queue = _reopen(queue)
+    assert [i["kpi_id"] for i in queue.items()] == ["2", "3", "4"]
@@ -0,0 +1,68 @@
+import datetime as dt
+import numpy as np
+import pandas as pd
+import pytest
+from utils import snapshot
+from utils.snapshot import SNAPSHOT_ARROW, SNAPSHOT_META, SNAPSHOT_PICKLE, load_snapshot, save_snapshot
+
+
+def _frame() -> pd.DataFrame:
+    """Colunas object como as do Excel: textos, números e datas misturados"""
+    return pd.DataFrame({
+        "Title": ["Brand", "Brand", "Sales"],
+        "序号 No.": [1, 2, 3],
+        "Achieved Jan": ["95%", 0.93, None],
+        "Target Jan": [1.5, np.nan, 7.0],
+        "Due": [pd.Timestamp("2024-01-31"), dt.date(2024, 2, 1), "sem prazo"],
+    })
+
+
+def _assert_same_cells(loaded: pd.DataFrame, df: pd.DataFrame):
+    """Mesmos valores e mesmos tipos por célula (0.93 continua float, "95%" continua texto)"""
+    assert list(loaded.columns) == list(df.columns)
+    for col in df.columns:
+        for got, expected in zip(loaded[col].tolist(), df[col].tolist()):
+            if pd.isna(expected):
+                assert pd.isna(got)
+            else:
+                assert got == expected and type(got) is type(expected), (col, got, expected)
+
+
+def test_arrow_round_trip_keeps_cell_types(tmp_path):
+    pytest.importorskip("pyarrow")
+    df = _frame()
+    assert save_snapshot(tmp_path, df, {"journal_seq": 7, "uploaded_seq": 5}) == "arrow"
+
+    loaded, meta = load_snapshot(tmp_path)
+    _assert_same_cells(loaded, df)
+    assert (meta["format"], meta["journal_seq"], meta["uploaded_seq"]) == ("arrow", 7, 5)
+
+
+def test_falls_back_to_pickle(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "pa", None)  # sem pyarrow instalado
+    df = _frame()
+    assert save_snapshot(tmp_path, df, {"journal_seq": 3}) == "pickle"
+    assert (tmp_path / SNAPSHOT_PICKLE).exists() and not (tmp_path / SNAPSHOT_ARROW).exists()
+
+    loaded, meta = load_snapshot(tmp_path)
+    _assert_same_cells(loaded, df)
+    assert meta["format"] == "pickle" and meta["journal_seq"] == 3
+
+
+def test_unpublished_snapshot_is_ignored(tmp_path):
+    # Sem o JSON de metadados o snapshot nunca foi publicado
+    assert load_snapshot(tmp_path) is None
+    (tmp_path / SNAPSHOT_PICKLE).write_bytes(b"lixo")
+    assert load_snapshot(tmp_path) is None
+
+
+def test_interrupted_save_keeps_previous_snapshot(tmp_path):
+    df = _frame()
+    save_snapshot(tmp_path, df, {"journal_seq": 1})
+    # Crash no meio da gravação seguinte: só sobram os .tmp, nada foi renomeado
+    (tmp_path / (SNAPSHOT_ARROW + ".tmp")).write_bytes(b"meio arquivo")
+    (tmp_path / (SNAPSHOT_META + ".tmp")).write_text("{", encoding="utf-8")
+
+    loaded, meta = load_snapshot(tmp_path)
+    _assert_same_cells(loaded, df)
+    assert meta["journal_seq"] == 1
@@ -0,0 +1,289 @@
+import io
+import re
+import html
+import math
+import zipfile
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import pandas as pd
+
+try:
+    import python_calamine  # noqa: F401  leitor Rust do xlsx, bem mais rápido que openpyxl
+    # engine="calamine" só existe a partir do pandas 2.2
+    EXCEL_ENGINE: Optional[str] = "calamine" if tuple(map(int, pd.__version__.split(".")[:2])) >= (2, 2) else None
+except ImportError:  # opcional: sem ele o pandas usa openpyxl
+    EXCEL_ENGINE = None
+
+
+def read_workbook(source, sheet_name, columns: Optional[Iterable[str]] = None,
+                  text_columns: Iterable[str] = ()) -> pd.DataFrame:
+    """
+    Lê a planilha projetando só as colunas usadas (comparadas sem espaços nas pontas,
+    como o backend faz depois do strip). As colunas de texto declaradas ficam sempre
+    como object, independente do que o leitor inferir naquele mês.
+    """
+    wanted = None if columns is None else frozenset(columns)
+    usecols = None if wanted is None else (lambda col: str(col).strip() in wanted)
+    df = pd.read_excel(source, sheet_name=sheet_name, usecols=usecols, engine=EXCEL_ENGINE)
+
+    stripped = df.columns.astype(str).str.strip()
+    text = frozenset(text_columns)
+    for position, col in enumerate(stripped):
+        if col in text and df.dtypes.iloc[position] != object:
+            df.isetitem(position, df.iloc[:, position].astype(object))
+    return df
+
+
+def overlay_columns(full: pd.DataFrame, projected: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reconstrói a planilha inteira para upload: parte do workbook completo e
+    sobrescreve as colunas que o backend carrega/edita. Colunas novas vão para o fim.
+    """
+    if len(full) != len(projected):
+        raise ValueError(f"Planilha remota com {len(full)} linhas, cache com {len(projected)}")
+    out = full.copy()
+    out.columns = out.columns.astype(str).str.strip()
+    for col in projected.columns:
+        out[col] = projected[col].to_numpy()
+    return out
+
+
+def row_key(title, number) -> Tuple[str, str]:
+    """
+    Identifica uma linha por (setor normalizado, 序号 No.), igual no DataFrame e no
+    XML da planilha: 3, 3.0 e "3" viram a mesma chave.
+    """
+    title = "" if title is None or pd.isna(title) else str(title).strip().lower()
+    if number is None or (not isinstance(number, str) and pd.isna(number)):
+        number = ""
+    elif isinstance(number, float) and number.is_integer():
+        number = str(int(number))
+    return title, str(number).strip()
+
+
+# Patch direto no XML: só as <row> editadas são reescritas; as demais entradas do zip
+# (estilos, sharedStrings, outras abas) e as outras linhas da aba seguem byte a byte
+_SHEET_RE = re.compile(r'<sheet\b[^>]*?\bname="([^"]*)"[^>]*?\br:id="([^"]*)"')
+_REL_RE = re.compile(r'<Relationship\b[^>]*?\bId="([^"]*)"[^>]*?\bTarget="([^"]*)"')
+_SI_RE = re.compile(r"<si>(.*?)</si>", re.S)
+_T_RE = re.compile(r"<t\b[^>]*?(?:/>|>(.*?)</t>)", re.S)
+_RPH_RE = re.compile(r"<rPh\b.*?</rPh>", re.S)
+# Excel, xlsxwriter e openpyxl gravam r como primeiro atributo: a busca literal é bem mais rápida
+_ROW_PATTERNS = (re.compile(r'<row r="(\d+)"[^>]*?(/?)>'), re.compile(r'<row\b[^>]*?\br="(\d+)"[^>]*?(/?)>'))
+_KEY_CELL_PATTERNS = (r'<c r="(?P<col>{cols})(?P<row>\d+)"', r'<c\b[^>]*?\br="(?P<col>{cols})(?P<row>\d+)"')
+_CELL_RE = re.compile(r"<c\b([^>]*?)(?:/>|>(.*?)</c>)", re.S)
+_ATTR_RE = re.compile(r'\b([rst])="([^"]*)"')
+_REF_RE = re.compile(r"([A-Z]+)(\d+)")
+_INT_RE = re.compile(r"-?\d+")
+_ILLEGAL_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for char in letters:
+        index = index * 26 + ord(char) - 64
+    return index
+
+
+def _column_letters(index: int) -> str:
+    letters = ""
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(65 + rest) + letters
+    return letters
+
+
+def _text(xml: str) -> str:
+    """Texto de um <si>/<is>: junta os <t> (rich text), sem a leitura fonética"""
+    return html.unescape("".join(t or "" for t in _T_RE.findall(_RPH_RE.sub("", xml))))
+
+
+def _sheet_path(zf: zipfile.ZipFile, sheet_name: str) -> Optional[str]:
+    """Caminho do XML da aba (workbook.xml -> rels); a primeira aba se o nome não existir"""
+    try:
+        sheets = _SHEET_RE.findall(zf.read("xl/workbook.xml").decode("utf-8"))
+        targets = dict(_REL_RE.findall(zf.read("xl/_rels/workbook.xml.rels").decode("utf-8")))
+    except KeyError:
+        return None
+    if not sheets:
+        return None
+    rel_id = next((rid for name, rid in sheets if html.unescape(name) == sheet_name), sheets[0][1])
+    target = targets.get(rel_id)
+    if target is None:
+        return None
+    return target.lstrip("/") if target.startswith("/") else "xl/" + target
+
+
+def _row_spans(sheet: str) -> Dict[int, Optional[Tuple[int, int]]]:
+    """Linha -> trecho do conteúdo da <row> no XML (None para <row/> vazia)"""
+    spans: Dict[int, Optional[Tuple[int, int]]] = {}
+    for pattern in _ROW_PATTERNS:
+        for match in pattern.finditer(sheet):
+            if match.group(2):
+                spans.setdefault(int(match.group(1)), None)
+                continue
+            end = sheet.find("</row>", match.end())
+            if end < 0:
+                raise ValueError("linha sem </row>")
+            spans.setdefault(int(match.group(1)), (match.end(), end))
+        if spans:
+            break
+    return spans
+
+
+def _key_cells(sheet: str, columns: Iterable[int]):
+    """Só as células das colunas dadas, em todas as linhas (sem montar as demais)"""
+    cols = "|".join(_column_letters(column) for column in columns)
+    for pattern in _KEY_CELL_PATTERNS:
+        matches = list(re.finditer(pattern.format(cols=cols) + r"[^>]*?(?:/>|>(?P<inner>.*?)</c>)", sheet, re.S))
+        if matches:
+            return matches
+    return []
+
+
+def _parse_cells(row_xml: str) -> List[Tuple[int, Dict[str, str], Optional[str], str]]:
+    """(coluna, atributos r/s/t, conteúdo, XML original) de cada <c> da linha"""
+    cells = []
+    for match in _CELL_RE.finditer(row_xml):
+        attrs = dict(_ATTR_RE.findall(match.group(1)))
+        ref = _REF_RE.fullmatch(attrs.get("r", ""))
+        if ref is None:
+            raise ValueError("célula sem referência")
+        cells.append((_column_index(ref.group(1)), attrs, match.group(2), match.group(0)))
+    return cells
+
+
+def _read_cell(attrs: Dict[str, str], inner: Optional[str], shared: List[str]):
+    """Valor de uma célula como o leitor do Excel devolveria (só texto e número importam aqui)"""
+    if inner is None:
+        return None
+    kind = attrs.get("t", "n")
+    if kind == "inlineStr":
+        return _text(inner)
+    v = re.search(r"<v>(.*?)</v>", inner, re.S)
+    if v is None:
+        return None
+    raw = html.unescape(v.group(1))
+    if kind == "s":
+        return shared[int(raw)]
+    if kind in ("str", "e"):
+        return raw
+    if kind == "b":
+        return raw == "1"
+    return int(raw) if _INT_RE.fullmatch(raw) else float(raw)
+
+
+def _write_cell(ref: str, style: Optional[str], value) -> Optional[str]:
+    """XML de uma célula com o novo valor (texto inline, sem tocar no sharedStrings)"""
+    if value is not None and not isinstance(value, str) and pd.isna(value):
+        value = None
+    if hasattr(value, "item"):
+        value = value.item()
+    s = f' s="{style}"' if style is not None else ""
+    if value is None:
+        return f'<c r="{ref}"{s}/>' if style is not None else ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}"{s} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        if not math.isfinite(value):
+            raise ValueError("número não finito")
+        return f'<c r="{ref}"{s}><v>{value!r}</v></c>'
+    if isinstance(value, str):
+        if _ILLEGAL_XML.search(value):
+            raise ValueError("caractere inválido no XML")
+        return f'<c r="{ref}"{s} t="inlineStr"><is><t xml:space="preserve">{html.escape(value, quote=False)}</t></is></c>'
+    raise ValueError(f"tipo não suportado no patch: {type(value).__name__}")
+
+
+def _patch_row(row_number: int, row_xml: str, cells: Dict[int, Any]) -> str:
+    """Conteúdo da <row> com as células editadas trocadas ou inseridas na ordem das colunas"""
+    existing = _parse_cells(row_xml)
+    by_column = {column: (attrs, inner, xml) for column, attrs, inner, xml in existing}
+    for column in cells:
+        attrs, inner, _ = by_column.get(column, ({}, None, ""))
+        if inner is not None and "<f" in inner:
+            raise ValueError("célula com fórmula")
+    out = []
+    pending = sorted(cells)
+    for column, attrs, inner, xml in existing:
+        while pending and pending[0] < column:
+            new = pending.pop(0)
+            out.append(_write_cell(f"{_column_letters(new)}{row_number}", None, cells[new]))
+        if pending and pending[0] == column:
+            pending.pop(0)
+            out.append(_write_cell(f"{_column_letters(column)}{row_number}", attrs.get("s"), cells[column]))
+        else:
+            out.append(xml)
+    for new in pending:
+        out.append(_write_cell(f"{_column_letters(new)}{row_number}", None, cells[new]))
+    return "".join(out)
+
+
+def patch_workbook(content: bytes, sheet_name: str, key_columns: Tuple[str, str],
+                   edits: Dict[Tuple[str, str], Dict[str, Any]]) -> Optional[bytes]:
+    """
+    Aplica só as células editadas sobre o workbook original, direto no XML da aba:
+    as <row> tocadas são reescritas e o resto do arquivo é copiado como está.
+    edits: {row_key: {coluna: valor}}. Retorna None se alguma linha/coluna não for
+    encontrada (ou a célula não der para escrever no XML), para o chamador regenerar o arquivo inteiro.
+    """
+    try:
+        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            sheet_path = _sheet_path(zf, sheet_name)
+            if sheet_path is None or sheet_path not in zf.namelist():
+                return None
+            sheet = zf.read(sheet_path).decode("utf-8")
+            shared = []
+            if "xl/sharedStrings.xml" in zf.namelist():
+                shared = [_text(si) for si in _SI_RE.findall(zf.read("xl/sharedStrings.xml").decode("utf-8"))]
+
+            rows = _row_spans(sheet)
+            if rows.get(1) is None:
+                return None
+            header = {}
+            for column, attrs, inner, _ in _parse_cells(sheet[slice(*rows[1])]):
+                value = _read_cell(attrs, inner, shared)
+                if value is not None:
+                    header.setdefault(str(value).strip(), column)
+            needed = set(key_columns).union(*edits.values())
+            if not needed.issubset(header):
+                return None
+
+            # Chave de cada linha a partir só das duas colunas-chave
+            title_col, number_col = (header[c] for c in key_columns)
+            keys: Dict[int, List] = {}
+            for match in _key_cells(sheet, (title_col, number_col)):
+                row_number = int(match.group("row"))
+                if row_number < 2:
+                    continue
+                attrs = dict(_ATTR_RE.findall(match.group(0)[:match.group(0).find(">") + 1]))
+                slot = 0 if _column_index(match.group("col")) == title_col else 1
+                keys.setdefault(row_number, [None, None])[slot] = _read_cell(attrs, match.group("inner"), shared)
+            found: Dict[Tuple[str, str], int] = {}
+            for row_number in sorted(keys):
+                # Primeira ocorrência, como o backend faz ao procurar o KPI
+                found.setdefault(row_key(*keys[row_number]), row_number)
+
+            patched: Dict[int, str] = {}
+            for key, cells in edits.items():
+                row_number = found.get(key)
+                if row_number is None or rows.get(row_number) is None:
+                    return None
+                patched[row_number] = _patch_row(row_number, sheet[slice(*rows[row_number])],
+                                                 {header[col]: value for col, value in cells.items()})
+
+            # Aba remontada: trechos originais + as linhas reescritas
+            parts, position = [], 0
+            for row_number in sorted(patched):
+                start, end = rows[row_number]
+                parts += [sheet[position:start], patched[row_number]]
+                position = end
+            parts.append(sheet[position:])
+
+            new_sheet = "".join(parts).encode("utf-8")
+            output = io.BytesIO()
+            with zipfile.ZipFile(output, "w") as out:
+                for item in zf.infolist():
+                    out.writestr(item, new_sheet if item.filename == sheet_path else zf.read(item.filename))
+            return output.getvalue()
+    except (zipfile.BadZipFile, UnicodeDecodeError, ValueError, IndexError, KeyError):
+        return None